@@ -0,0 +1,161 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from CircuitSolver import (component_arrays, count_nodes, floating_nodes, node_components, resistor_currents,
+                           solve_circuit)
+
+# Islands with fewer nodes than this are solved in the calling thread
+PARALLEL_MIN_NODES = 10000
+_MAX_PASSES = 64
+
+
+def _merge_parallel(g, a, b):
+    # Resistors between the same pair of nodes become one with the summed
+    # conductance; resistors with both ends on one node carry no current
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    keep = lo != hi
+    span = hi.max(initial=0) + 1
+    pairs, inverse = np.unique(lo[keep] * span + hi[keep], return_inverse=True)
+    return np.bincount(inverse, g[keep], len(pairs)), pairs // span, pairs % span
+
+
+def reduce_series_parallel(resistors, sources=(), num_nodes=None):
+    # Shrinks the resistor network before it is solved: parallel resistors
+    # are merged, and a node joined by exactly two resistors and nothing else
+    # is removed, the two resistors becoming one in series. Each pass removes
+    # an independent set of such nodes (a node goes when its hashed priority
+    # is below that of its candidate neighbours), so a long chain disappears
+    # in a logarithmic number of passes.
+    # Returns the conductances and end nodes of the reduced resistors and the
+    # eliminations, one (nodes, neighbour1, neighbour2, g1, g2) per pass, for
+    # restore_potentials.
+    if num_nodes is None:
+        num_nodes = count_nodes(resistors, sources)
+    r, a, b = component_arrays(resistors)
+    if np.any(r == 0):
+        raise ValueError("Сопротивление резистора не может быть равно нулю.")
+    g, a, b = _merge_parallel(1 / r, a, b)
+
+    protected = np.zeros(num_nodes + 1, dtype=bool)
+    protected[0] = True
+    protected[component_arrays(sources)[1]] = True
+    protected[component_arrays(sources)[2]] = True
+    priority = (np.arange(num_nodes + 1, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2**32)
+
+    eliminations = []
+    for _ in range(_MAX_PASSES):
+        degree = np.bincount(a, minlength=num_nodes + 1) + np.bincount(b, minlength=num_nodes + 1)
+        candidate = (degree == 2) & ~protected
+        if not candidate.any():
+            break
+
+        # The two resistors of every candidate node, next to each other
+        ends = np.concatenate([a, b])
+        others = np.concatenate([b, a])
+        edges = np.concatenate([np.arange(len(g)), np.arange(len(g))])
+        at = candidate[ends]
+        order = np.argsort(ends[at], kind="stable")
+        nodes = ends[at][order][::2]
+        first, second = edges[at][order][::2], edges[at][order][1::2]
+        u, w = others[at][order][::2], others[at][order][1::2]
+
+        chosen = ((~candidate[u] | (priority[u] > priority[nodes]))
+                  & (~candidate[w] | (priority[w] > priority[nodes])))
+        nodes, first, second, u, w = nodes[chosen], first[chosen], second[chosen], u[chosen], w[chosen]
+        eliminations.append((nodes, u, w, g[first], g[second]))
+
+        removed = np.zeros(len(g), dtype=bool)
+        removed[first] = True
+        removed[second] = True
+        series = g[first] * g[second] / (g[first] + g[second])
+        g, a, b = _merge_parallel(np.concatenate([g[~removed], series]), np.concatenate([a[~removed], u]),
+                                  np.concatenate([b[~removed], w]))
+    return g, a, b, eliminations
+
+
+def restore_potentials(potentials, eliminations):
+    # potentials: (num_nodes + 1,) with index 0 for ground, filled in for the
+    # nodes of the reduced network; fills in the eliminated nodes in place,
+    # last pass first, each as the divider between its two neighbours
+    for nodes, u, w, g1, g2 in reversed(eliminations):
+        potentials[nodes] = (g1 * potentials[u] + g2 * potentials[w]) / (g1 + g2)
+    return potentials
+
+
+def _solve_island(resistors, sources, nodes, reduce, method):
+    # nodes: the node numbers of one or more islands, resistors and sources
+    # their elements; returns the potentials of nodes and the source currents
+    local = np.zeros(nodes.max() + 1, dtype=np.int64)
+    local[nodes] = np.arange(1, len(nodes) + 1)
+    r, a, b = component_arrays(resistors)
+    v, s1, s2 = component_arrays(sources)
+    s1, s2 = local[s1], local[s2]
+    if reduce:
+        g, a, b, eliminations = reduce_series_parallel(np.column_stack([r, local[a], local[b]]),
+                                                       np.column_stack([v, s1, s2]), len(nodes))
+        r = 1 / g
+    else:
+        a, b, eliminations = local[a], local[b], []
+
+    # Renumber what is left after the reduction
+    kept = np.unique(np.concatenate([a, b, s1, s2, [0]]))
+    compact = np.zeros(len(nodes) + 1, dtype=np.int64)
+    compact[kept] = np.arange(len(kept))
+    x, _, currents = solve_circuit(np.column_stack([r, compact[a], compact[b]]),
+                                   np.column_stack([v, compact[s1], compact[s2]]), len(kept) - 1, method,
+                                   source_currents=True)
+    potentials = np.zeros(len(nodes) + 1)
+    potentials[kept[1:]] = x
+    return restore_potentials(potentials, eliminations)[1:], currents
+
+
+def solve_components(resistors, sources, num_nodes=None, method="direct", reduce=True, workers=1):
+    # Splits the circuit at ground into islands that share no node but
+    # ground and solves them independently, after series/parallel reduction
+    # with reduce: islands of PARALLEL_MIN_NODES nodes or more each on their
+    # own, in workers processes (None: one per CPU), and all the smaller ones
+    # together in one system. Nodes without a path to ground are reported
+    # before anything is solved.
+    # Returns node potentials, resistor currents and source currents, as
+    # solve_circuit(..., source_currents=True).
+    if num_nodes is None:
+        num_nodes = count_nodes(resistors, sources)
+    floating = floating_nodes(resistors, sources, num_nodes)
+    if len(floating):
+        listed = ", ".join(map(str, floating[:20])) + (" ..." if len(floating) > 20 else "")
+        raise np.linalg.LinAlgError(f"Узлы не связаны с землей: {listed}")
+
+    resistors = np.column_stack(component_arrays(resistors))
+    sources = np.column_stack(component_arrays(sources))
+    # Components of the circuit with ground removed; an element belongs to
+    # the island of its non-ground end
+    _, r1, r2 = component_arrays(resistors)
+    _, s1, s2 = component_arrays(sources)
+    labels = node_components(num_nodes, resistors[(r1 != 0) & (r2 != 0)], sources[(s1 != 0) & (s2 != 0)])
+    sizes = np.bincount(labels[1:], minlength=num_nodes + 1)
+    large = np.flatnonzero(sizes >= PARALLEL_MIN_NODES)
+    # Group 0 gathers the small islands, group k the k-th large one
+    group = np.zeros(num_nodes + 1, dtype=np.int64)
+    group[large] = np.arange(1, len(large) + 1)
+    node_group = group[labels]
+    node_group[0] = -1
+    r_group = node_group[np.maximum(r1, r2)]
+    s_group = node_group[np.maximum(s1, s2)]
+
+    groups = [k for k in range(len(large) + 1) if np.any(node_group == k)]
+    jobs = [(resistors[r_group == k], sources[s_group == k], np.flatnonzero(node_group == k), reduce, method)
+            for k in groups]
+    if workers != 1 and len(large) > 1:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            results = list(pool.map(_solve_island, *zip(*jobs)))
+    else:
+        results = [_solve_island(*job) for job in jobs]
+
+    potentials = np.zeros(num_nodes + 1)
+    source_currents = np.zeros(len(sources))
+    for k, (x, currents) in zip(groups, results):
+        potentials[node_group == k] = x
+        source_currents[s_group == k] = currents
+    return potentials[1:], resistor_currents(resistors, potentials[1:]), source_currents
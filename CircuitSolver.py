@@ -0,0 +1,487 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
+
+Netlist = namedtuple("Netlist", ["resistors", "sources", "resistor_names", "source_names", "node_names"])
+
+# SPICE scale factors
+_SCALES = {"t": 1e12, "g": 1e9, "meg": 1e6, "k": 1e3, "mil": 25.4e-6,
+           "m": 1e-3, "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15}
+# A number, an optional scale factor ("meg" and "mil" before "m"), then any
+# letters, which SPICE ignores (units such as "ohm" or "V")
+_VALUE = re.compile(r"([+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)(meg|mil|[tgkmunpf])?[a-z]*")
+_GROUND = ("0", "gnd")
+
+FACTOR_CACHE_SIZE = 16
+# An iterative solution is rejected when its residual, relative to
+# |A| |x| + |z|, exceeds the requested tolerance by more than this factor
+_RESIDUAL_MARGIN = 100
+_factor_cache = OrderedDict()
+
+
+def component_arrays(components):
+    # (value, node1, node2) rows -> value, node1, node2 arrays
+    components = np.asarray(components, dtype=float).reshape(-1, 3)
+    return components[:, 0], components[:, 1].astype(np.int64), components[:, 2].astype(np.int64)
+
+
+def count_nodes(*components):
+    # Highest node number over any number of component lists
+    nodes = [component_arrays(c)[1:] for c in components]
+    return int(max([0] + [n.max() for pair in nodes for n in pair if len(n)]))
+
+
+def node_components(num_nodes, *components):
+    # Union-find over nodes 0..num_nodes joined by the elements of every list
+    # in components, done for all elements at once: each round hooks the
+    # larger of the two roots of every element onto the smaller one, then
+    # pointer jumping flattens the trees. Returns the root of every node,
+    # which is the lowest node of its component (0 for everything connected
+    # to ground).
+    ends = [component_arrays(c)[1:] for c in components]
+    a = np.concatenate([e[0] for e in ends] + [np.zeros(0, dtype=np.int64)])
+    b = np.concatenate([e[1] for e in ends] + [np.zeros(0, dtype=np.int64)])
+    parent = np.arange(num_nodes + 1)
+    while True:
+        ra, rb = parent[a], parent[b]
+        differ = ra != rb
+        if not differ.any():
+            return parent
+        np.minimum.at(parent, np.maximum(ra, rb)[differ], np.minimum(ra, rb)[differ])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def floating_nodes(resistors, sources, num_nodes):
+    # Nodes with no path to ground (including node numbers no element uses):
+    # their potentials are undefined and the matrix is singular
+    return np.flatnonzero(node_components(num_nodes, resistors, sources)[1:]) + 1
+
+
+def has_source_loop(sources, num_nodes):
+    # Voltage sources closing a loop (parallel sources included) fix the
+    # same voltage twice and make the matrix singular. The sources form a
+    # forest exactly when their number equals the nodes they touch minus the
+    # components those nodes fall into.
+    _, n1, n2 = component_arrays(sources)
+    if not len(n1):
+        return False
+    roots = node_components(num_nodes, sources)
+    touched = np.unique(np.concatenate([n1, n2]))
+    return len(n1) > len(touched) - len(np.unique(roots[touched]))
+
+
+def create_admittance_matrix(resistors, sources, num_nodes):
+    # Modified nodal analysis: the unknowns are the potentials of nodes
+    # 1..num_nodes (node 0 is ground) followed by the currents through the
+    # voltage sources, node1 -> node2 inside the source. Returns the sparse
+    # (CSR) matrix
+    #     [G  B]
+    #     [B' 0]
+    # and the right-hand side z = [0, source voltages], where a source
+    # (v, node1, node2) enforces v(node1) - v(node2) = v.
+    r, n1, n2 = component_arrays(resistors)
+    if np.any(r == 0):
+        raise ValueError("Сопротивление резистора не может быть равно нулю.")
+    g = 1 / r
+    _, s1, s2 = component_arrays(sources)
+    branches = num_nodes + np.arange(len(s1))
+    ones = np.ones(len(s1))
+
+    rows = np.concatenate([n1, n2, n1, n2, s1, s2, branches + 1, branches + 1]) - 1
+    cols = np.concatenate([n1, n2, n2, n1, branches + 1, branches + 1, s1, s2]) - 1
+    data = np.concatenate([g, g, -g, -g, ones, -ones, ones, -ones])
+    keep = (rows >= 0) & (cols >= 0)
+    size = num_nodes + len(s1)
+    # Duplicate (row, col) entries are summed by the COO -> CSR conversion
+    A = sparse.coo_matrix((data[keep], (rows[keep], cols[keep])), shape=(size, size)).tocsr()
+    return A, source_vector(sources, num_nodes)
+
+
+def source_vector(sources, num_nodes):
+    v = component_arrays(sources)[0]
+    return np.concatenate([np.zeros(num_nodes), v])
+
+
+def resistor_currents(resistors, potentials):
+    # potentials is (num_nodes,) or (scenarios, num_nodes)
+    r, n1, n2 = component_arrays(resistors)
+    potentials = np.asarray(potentials)
+    # Index 0 of the padded vector is the ground potential
+    padded = np.concatenate([np.zeros(potentials.shape[:-1] + (1,)), potentials], axis=-1)
+    return (padded[..., n1] - padded[..., n2]) / r
+
+
+def circuit_key(resistors, sources, num_nodes):
+    # Hash of the node count, the resistors and the source terminals: two
+    # circuits with the same key have the same MNA matrix
+    digest = hashlib.blake2b(digest_size=16)
+    for array in component_arrays(resistors) + component_arrays(sources)[1:]:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return num_nodes, digest.hexdigest()
+
+
+class FactorizedCircuit:
+    # Sparse LU factorization of the MNA matrix for fixed resistors and
+    # source terminals. Any number of source voltage sets is then solved by
+    # forward/back substitution only.
+
+    def __init__(self, resistors, sources=(), num_nodes=None):
+        if num_nodes is None:
+            num_nodes = count_nodes(resistors, sources)
+        # Private copies: the caller may keep editing its lists
+        self.resistors = np.column_stack(component_arrays(resistors))
+        self.sources = np.column_stack(component_arrays(sources))
+        self.num_nodes = num_nodes
+        self.A, _ = create_admittance_matrix(resistors, sources, num_nodes)
+        try:
+            self.lu = sparse_linalg.splu(self.A.tocsc())
+        except RuntimeError as error:
+            # SuperLU reports an exactly singular matrix as RuntimeError
+            raise np.linalg.LinAlgError(str(error)) from error
+
+    def solve(self, z):
+        # z is (size,) or (size, scenarios); one call for all columns
+        return self.lu.solve(np.asarray(z, dtype=float))
+
+    def _rhs(self, values):
+        # (scenarios, sources) voltages -> (size, scenarios) right-hand sides
+        if values is None:
+            values = self.sources[:, 0]
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        z = np.zeros((self.num_nodes + len(self.sources), len(values)))
+        z[self.num_nodes:] = values.T
+        return z
+
+    def solve_sources(self, values=None):
+        # values is (scenarios, len(sources)) of source voltages; None takes
+        # the voltages the circuit was built with. Returns potentials
+        # (scenarios, num_nodes), resistor currents (scenarios, resistors) and
+        # source currents (scenarios, sources).
+        x = self.solve(self._rhs(values)).T
+        potentials = x[:, :self.num_nodes]
+        return potentials, resistor_currents(self.resistors, potentials), x[:, self.num_nodes:]
+
+    def sweep_resistors(self, indices, values, source_values=None, nodes=None):
+        # Potentials for many values of the resistors self.resistors[indices]
+        # without refactorizing. Changing k conductances is a rank-k update
+        # A + U D U^T (U holds the +1/-1 node incidence of each resistor,
+        # D the conductance changes), so by the Woodbury identity
+        #     x = x0 - W (1 + D C)^-1 D U^T x0,  W = A^-1 U,  C = U^T W
+        # which costs k extra substitutions in total and a k x k solve per
+        # scenario. values is (scenarios, k) of resistances (for k = 1 also a
+        # flat array: the Sherman-Morrison sweep); source_values is one set of
+        # source voltages (the circuit's own by default). Returns the
+        # potentials of nodes (node numbers, all by default),
+        # (scenarios, len(nodes)), and the currents through the swept
+        # resistors, (scenarios, k).
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        values = np.asarray(values, dtype=float).reshape(-1, len(indices))
+        if np.any(values == 0):
+            raise ValueError("Сопротивление резистора не может быть равно нулю.")
+        r, n1, n2 = component_arrays(self.resistors[indices])
+        delta = 1 / values - 1 / r
+
+        columns = np.arange(len(indices))
+        rows = np.concatenate([n1, n2]) - 1
+        data = np.concatenate([np.ones(len(n1)), -np.ones(len(n2))])
+        keep = rows >= 0
+        U = sparse.coo_matrix((data[keep], (rows[keep], np.concatenate([columns, columns])[keep])),
+                              shape=(self.A.shape[0], len(indices))).tocsr()
+
+        x0 = self.solve(self._rhs(source_values)[:, 0])[:self.num_nodes]
+        W = self.solve(U.toarray())[:self.num_nodes]
+        U = U[:self.num_nodes]
+        C = U.T @ W
+        b = U.T @ x0
+
+        # (1 + D C) y = D U^T x0 for every scenario at once
+        A = np.eye(len(indices)) + delta[:, :, None] * C[None, :, :]
+        y = np.linalg.solve(A, (delta * b)[:, :, None])[:, :, 0]
+        if not np.all(np.isfinite(y)):
+            raise np.linalg.LinAlgError("Матрица проводимостей вырождена. Проверьте конфигурацию схемы.")
+
+        # Voltage across the swept resistors: U^T x = b - C y
+        currents = (b - y @ C.T) / values
+        if nodes is None:
+            return x0 - y @ W.T, currents
+        rows = np.asarray(nodes, dtype=np.int64) - 1
+        return x0[rows] - y @ W[rows].T, currents
+
+    def sweep_resistor(self, index, values, source_values=None, nodes=None):
+        # Sherman-Morrison sweep over the value of one resistor; the currents
+        # through it are returned as a flat array
+        potentials, currents = self.sweep_resistors([index], np.ravel(values), source_values, nodes)
+        return potentials, currents[:, 0]
+
+
+def factorize(resistors, sources=(), num_nodes=None):
+    # FactorizedCircuit from a small LRU cache keyed by circuit_key
+    if num_nodes is None:
+        num_nodes = count_nodes(resistors, sources)
+    key = circuit_key(resistors, sources, num_nodes)
+    factor = _factor_cache.get(key)
+    if factor is None:
+        factor = FactorizedCircuit(resistors, sources, num_nodes)
+        _factor_cache[key] = factor
+        while len(_factor_cache) > FACTOR_CACHE_SIZE:
+            _factor_cache.popitem(last=False)
+    else:
+        _factor_cache.move_to_end(key)
+    return factor
+
+
+def clear_factor_cache():
+    _factor_cache.clear()
+
+
+def _solve_iterative(A, z, num_nodes, tol, maxiter, preconditioner):
+    # The MNA matrix is symmetric but indefinite once voltage sources add
+    # their zero diagonal block, so CG only applies to a pure conductance
+    # matrix and MINRES is used otherwise. The Jacobi preconditioner has to
+    # stay positive definite: the source rows get 1.
+    if preconditioner == "jacobi":
+        diagonal = A.diagonal()
+        if np.any(diagonal[:num_nodes] == 0):
+            raise np.linalg.LinAlgError("Матрица проводимостей вырождена.")
+        diagonal[num_nodes:] = 1
+        M = sparse.diags(1 / diagonal)
+    elif preconditioner is None:
+        M = None
+    else:
+        raise ValueError(f"Неизвестный предобуславливатель: {preconditioner}")
+
+    if A.shape[0] == num_nodes:
+        x, info = sparse_linalg.cg(A, z, rtol=tol, maxiter=maxiter, M=M)
+    else:
+        x, info = sparse_linalg.minres(A, z, rtol=tol, maxiter=maxiter, M=M)
+    if info != 0 or not np.all(np.isfinite(x)):
+        raise np.linalg.LinAlgError("Итерационный метод не сошелся. Проверьте конфигурацию схемы.")
+    # On a singular system MINRES stops at a least-squares solution and
+    # reports success; the true residual gives it away. It is measured
+    # against |A| |x| + |z|, the scale MINRES itself converges on
+    residual = np.linalg.norm(A @ x - z)
+    scale = sparse_linalg.norm(A, np.inf) * np.linalg.norm(x) + np.linalg.norm(z)
+    if residual > _RESIDUAL_MARGIN * tol * max(scale, np.finfo(float).tiny):
+        raise np.linalg.LinAlgError("Матрица проводимостей вырождена: система не имеет решения.")
+    return x
+
+
+def solve_nodal(A, z, num_nodes=None, method="direct", tol=1e-10, maxiter=None, preconditioner="jacobi"):
+    # num_nodes separates node rows from source rows (all rows by default)
+    if method == "dense":
+        return np.linalg.solve(A.toarray(), z)
+    if method == "direct":
+        try:
+            return sparse_linalg.splu(A.tocsc()).solve(z)
+        except RuntimeError as error:
+            raise np.linalg.LinAlgError(str(error)) from error
+    if method == "iterative":
+        return _solve_iterative(A, z, A.shape[0] if num_nodes is None else num_nodes, tol, maxiter,
+                                preconditioner)
+    raise ValueError(f"Неизвестный метод решения: {method}")
+
+
+def solve_circuit(resistors, sources, num_nodes=None, method="direct", tol=1e-10, maxiter=None,
+                  preconditioner="jacobi", reuse_factorization=False, source_currents=False):
+    # Returns node potentials (nodes 1..num_nodes) and resistor currents
+    # n1 -> n2, plus the voltage source currents (node1 -> node2 through the
+    # source) with source_currents. method is "direct" (sparse LU),
+    # "iterative" (preconditioned MINRES/CG for large resistive networks) or
+    # "dense".
+    # With reuse_factorization the LU factors stay in the factorize() cache,
+    # so repeated solves of the same network with other source voltages skip
+    # the factorization; clear_factor_cache() releases them.
+    if num_nodes is None:
+        num_nodes = count_nodes(resistors, sources)
+    # Cheap check before any factorization
+    floating = floating_nodes(resistors, sources, num_nodes)
+    if len(floating):
+        listed = ", ".join(map(str, floating[:20])) + (" ..." if len(floating) > 20 else "")
+        raise np.linalg.LinAlgError(f"Узлы не связаны с землей: {listed}")
+    if has_source_loop(sources, num_nodes):
+        raise np.linalg.LinAlgError("Источники напряжения образуют замкнутый контур.")
+    if method == "direct" and reuse_factorization:
+        x = factorize(resistors, sources, num_nodes).solve(source_vector(sources, num_nodes))
+    else:
+        A, z = create_admittance_matrix(resistors, sources, num_nodes)
+        x = solve_nodal(A, z, num_nodes, method, tol, maxiter, preconditioner)
+    potentials = x[:num_nodes]
+    if source_currents:
+        return potentials, resistor_currents(resistors, potentials), x[num_nodes:]
+    return potentials, resistor_currents(resistors, potentials)
+
+
+def parse_value(text):
+    match = _VALUE.fullmatch(text.strip().lower())
+    if match is None:
+        raise ValueError(f"Некорректное значение: {text}")
+    number, scale = match.groups()
+    return float(number) * _SCALES.get(scale, 1.0)
+
+
+def parse_netlist(text, title=True):
+    # SPICE-like netlist: "R<name> n1 n2 value" and "V<name> n1 n2 value".
+    # As in SPICE the first line is the title (title=False for files without
+    # one). "*" starts a comment line, ";" a trailing comment, dot-commands
+    # are ignored, a line starting with "+" continues the previous one.
+    # Nodes are names ("0" and "gnd" are ground), numbered 1..N in order of
+    # appearance; node_names[i - 1] is the name of node i.
+    lines = []
+    for number, raw in enumerate(text.splitlines(), 1):
+        if title and number == 1:
+            continue
+        line = raw.split(";", 1)[0].strip()
+        if not line or line.startswith("*"):
+            continue
+        if line.startswith("+") and lines:
+            lines[-1][1] += " " + line[1:]
+        else:
+            lines.append([number, line])
+
+    netlist = Netlist([], [], [], [], [])
+    nodes = {}
+
+    def node_index(name):
+        key = name.lower()
+        if key in _GROUND:
+            return 0
+        if key not in nodes:
+            nodes[key] = len(nodes) + 1
+            netlist.node_names.append(name)
+        return nodes[key]
+
+    for number, line in lines:
+        if line.startswith("."):
+            if line.lower().startswith(".end") and not line.lower().startswith(".ends"):
+                break
+            continue
+        fields = line.split()
+        kind = fields[0][0].upper()
+        if kind not in "RV" or len(fields) < 4:
+            raise ValueError(f"Строка {number}: неподдерживаемый элемент \"{line}\"")
+        element = (parse_value(fields[3]), node_index(fields[1]), node_index(fields[2]))
+        if kind == "R":
+            netlist.resistors.append(element)
+            netlist.resistor_names.append(fields[0])
+        else:
+            netlist.sources.append(element)
+            netlist.source_names.append(fields[0])
+    return netlist
+
+
+def read_netlist(path, title=True):
+    with open(path, encoding="utf-8") as file:
+        return parse_netlist(file.read(), title)
+
+
+def write_result(path, netlist, potentials, currents, fmt="csv"):
+    # currents: the resistors followed by the voltage sources
+    names = netlist.resistor_names + netlist.source_names
+    if fmt == "json":
+        result = {
+            "potentials": {name: float(p) for name, p in zip(netlist.node_names, potentials)},
+            "currents": {name: float(i) for name, i in zip(names, currents)},
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+        return
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["kind", "name", "value"])
+        writer.writerows(("potential", name, repr(float(p))) for name, p in zip(netlist.node_names, potentials))
+        writer.writerows(("current", name, repr(float(i))) for name, i in zip(names, currents))
+
+
+def solve_netlist_file(path, output, fmt="csv", method="direct", title=True):
+    netlist = read_netlist(path, title)
+    potentials, currents, source_currents = solve_circuit(netlist.resistors, netlist.sources,
+                                                          len(netlist.node_names), method, source_currents=True)
+    write_result(output, netlist, potentials, np.concatenate([currents, source_currents]), fmt)
+    return output
+
+
+def _solve_job(job):
+    path, output, fmt, method, title = job
+    try:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        return path, solve_netlist_file(path, output, fmt, method, title), None
+    except (OSError, ValueError, np.linalg.LinAlgError) as error:
+        return path, None, str(error)
+
+
+def find_netlists(paths, extensions=(".cir", ".net", ".sp", ".txt")):
+    # (path, path relative to the directory it was found in) pairs
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend((os.path.join(root, name), os.path.relpath(os.path.join(root, name), path))
+                             for name in sorted(names) if name.lower().endswith(extensions))
+        else:
+            files.append((path, os.path.basename(path)))
+    return files
+
+
+def solve_netlists(paths, output_dir, fmt="csv", method="direct", jobs=None, title=True):
+    # Solves every netlist in paths (files or directories) across a process
+    # pool; yields (netlist path, result path or None, error message or None).
+    # A result keeps the netlist's path relative to its directory and its
+    # extension: dir/a/x.cir -> output_dir/a/x.cir.csv
+    work = []
+    outputs = {}
+    for path, relative in find_netlists(paths):
+        output = os.path.join(output_dir, f"{relative}.{fmt}")
+        key = os.path.normcase(os.path.abspath(output))
+        if key in outputs:
+            raise ValueError(f"Файлы {outputs[key]} и {path} дают один и тот же файл результата {output}")
+        outputs[key] = path
+        work.append((path, output, fmt, method, title))
+
+    os.makedirs(output_dir, exist_ok=True)
+    if jobs == 1:
+        yield from map(_solve_job, work)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(_solve_job, work, chunksize=max(1, len(work) // (4 * (jobs or os.cpu_count() or 1))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчет электрических схем из файлов списков соединений.")
+    parser.add_argument("paths", nargs="+", help="файлы или каталоги со списками соединений")
+    parser.add_argument("-o", "--output", default="results", help="каталог для результатов")
+    parser.add_argument("-f", "--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("-m", "--method", choices=("direct", "iterative", "dense"), default="direct")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--no-title", dest="title", action="store_false",
+                        help="первая строка файла — не заголовок, а описание элемента")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    try:
+        for path, _, error in solve_netlists(args.paths, args.output, args.format, args.method, args.jobs,
+                                             args.title):
+            if error is not None:
+                failed += 1
+                print(f"{path}: {error}", file=sys.stderr)
+    except ValueError as error:
+        # Two inputs mapped to the same result file; nothing was solved
+        print(error, file=sys.stderr)
+        return 1
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+from scipy.sparse import linalg as sparse_linalg
+
+from CircuitSolver import component_arrays, count_nodes, create_admittance_matrix, source_vector
+
+DEFAULT_CHUNK_MEMORY = 64 * 2**20
+
+
+def _companion(capacitors, inductors, dt, method):
+    # Every capacitor and inductor becomes a conductance g in parallel with a
+    # history current source: i(n+1) = g u(n+1) - J(n), u = v(node1) - v(node2).
+    #   capacitor, backward Euler: g = C/h,    J = g u(n)
+    #   capacitor, trapezoidal:    g = 2C/h,   J = g u(n) + i(n)
+    #   inductor,  backward Euler: g = h/L,    J = -i(n)
+    #   inductor,  trapezoidal:    g = h/(2L), J = -g u(n) - i(n)
+    # J = a u(n) + b i(n) with per-element coefficients a and b
+    c, c1, c2 = component_arrays(capacitors)
+    l, l1, l2 = component_arrays(inductors)
+    if np.any(c <= 0) or np.any(l <= 0):
+        raise ValueError("Емкость и индуктивность должны быть положительными.")
+    if method == "euler":
+        g = np.concatenate([c / dt, dt / l])
+        a = np.concatenate([c / dt, np.zeros(len(l))])
+        b = np.concatenate([np.zeros(len(c)), -np.ones(len(l))])
+    elif method == "trapezoidal":
+        g = np.concatenate([2 * c / dt, dt / (2 * l)])
+        a = np.concatenate([2 * c / dt, -dt / (2 * l)])
+        b = -np.ones(len(c) + len(l))
+        b[:len(c)] = 1
+    else:
+        raise ValueError(f"Неизвестный метод интегрирования: {method}")
+    return g, a, b, np.concatenate([c1, l1]), np.concatenate([c2, l2])
+
+
+def simulate_transient(resistors, sources, capacitors=(), inductors=(), t_stop=1.0, dt=1e-3, num_nodes=None,
+                       method="trapezoidal", source_values=None, nodes=None, directory=None,
+                       chunk_memory=DEFAULT_CHUNK_MEMORY):
+    # Time stepping of an RLC network from rest (all potentials and inductor
+    # currents zero at t = 0) with companion models, method "trapezoidal" or
+    # "euler" (backward Euler). The step is constant, so the nodal matrix is
+    # factorized once and every step costs one substitution.
+    # Sources are ideal voltage sources; source_values(t) returns their
+    # voltages at time t (constant values from sources by default). nodes selects the recorded node
+    # numbers (all by default). With directory the waveforms go to t.npy and
+    # V.npy there in chunks of about chunk_memory bytes and read-only memory
+    # maps are returned, so the run length is not limited by memory.
+    # Returns t (steps + 1,) and V (steps + 1, len(nodes)).
+    if dt <= 0 or t_stop <= 0:
+        raise ValueError("Шаг и время расчета должны быть положительными.")
+    if num_nodes is None:
+        num_nodes = count_nodes(resistors, sources, capacitors, inductors)
+    nodes = np.arange(1, num_nodes + 1) if nodes is None else np.asarray(nodes, dtype=np.int64)
+    steps = max(1, int(round(t_stop / dt)))
+
+    def factorize(g, n1, n2):
+        companions = np.column_stack([1 / g, n1, n2])
+        A, _ = create_admittance_matrix(np.concatenate([np.reshape(resistors, (-1, 3)), companions]), sources,
+                                        num_nodes)
+        try:
+            return sparse_linalg.splu(A.tocsc())
+        except RuntimeError as error:
+            raise np.linalg.LinAlgError(str(error)) from error
+
+    g, a, b, n1, n2 = _companion(capacitors, inductors, dt, method)
+    lu = factorize(g, n1, n2)
+    # The trapezoidal rule needs the element currents at t = 0, which a step
+    # switched on from rest does not give; as in SPICE the first step is taken
+    # with backward Euler (its own factorization, used once)
+    if method == "euler":
+        first = (lu, g, a, b)
+    else:
+        g0, a0, b0, _, _ = _companion(capacitors, inductors, dt, "euler")
+        first = (factorize(g0, n1, n2), g0, a0, b0)
+
+    # MNA right-hand side: companion currents in the node rows, source
+    # voltages in the source rows
+    z = source_vector(sources, num_nodes)
+    keep1, keep2 = n1 != 0, n2 != 0
+
+    rows = max(1, min(steps + 1, int(chunk_memory) // (8 * max(1, len(nodes)))))
+    if directory is None:
+        V = np.empty((steps + 1, len(nodes)))
+        t = np.arange(steps + 1) * dt
+    else:
+        os.makedirs(directory, exist_ok=True)
+        V = np.lib.format.open_memmap(os.path.join(directory, "V.npy"), mode="w+", shape=(steps + 1, len(nodes)))
+        t = np.lib.format.open_memmap(os.path.join(directory, "t.npy"), mode="w+", shape=(steps + 1,))
+    chunk = np.empty((rows, len(nodes)))
+
+    # Index 0 of the padded vector is the ground potential
+    padded = np.zeros(num_nodes + 1)
+    current = np.zeros(len(g))
+    chunk[0] = 0.0
+    filled = 1
+    written = 0
+    for step in range(1, steps + 1):
+        step_lu, step_g, step_a, step_b = first if step == 1 else (lu, g, a, b)
+        J = step_a * (padded[n1] - padded[n2]) + step_b * current
+        if source_values is not None:
+            z[num_nodes:] = source_values(step * dt)
+        z[:num_nodes] = np.bincount(n1[keep1] - 1, J[keep1], num_nodes) - np.bincount(n2[keep2] - 1, J[keep2],
+                                                                                       num_nodes)
+        padded[1:] = step_lu.solve(z)[:num_nodes]
+        current = step_g * (padded[n1] - padded[n2]) - J
+
+        # A full chunk goes out before the next step is written into it
+        if filled == rows:
+            V[written:written + filled] = chunk[:filled]
+            written += filled
+            filled = 0
+        chunk[filled] = padded[nodes]
+        filled += 1
+    V[written:written + filled] = chunk[:filled]
+
+    if directory is None:
+        return t, V
+    t[:] = np.arange(steps + 1) * dt
+    V.flush()
+    t.flush()
+    del V, t
+    return (np.load(os.path.join(directory, "t.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "V.npy"), mmap_mode="r"))
@@ -1,6 +1,175 @@
+from collections import defaultdict
+
 import numpy as np
 import tkinter as tk
-from tkinter import messagebox, Canvas
+from tkinter import messagebox, filedialog, Canvas
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from CircuitSolver import read_netlist, solve_circuit
+
+
+def layered_layout(elements, num_nodes):
+    # Nodes are placed in rows by their graph distance from ground: row 0 holds
+    # the nodes connected to ground, row k those k elements further away.
+    # A part of the circuit that does not reach ground starts from its lowest
+    # node. Returns (row, column) arrays indexed by node number (index 0 unused).
+    n1 = np.array([e[2] for e in elements], dtype=np.int64).reshape(-1)
+    n2 = np.array([e[3] for e in elements], dtype=np.int64).reshape(-1)
+    graph = sparse.coo_matrix((np.ones(len(n1)), (n1, n2)), shape=(num_nodes + 1, num_nodes + 1)).tocsr()
+    _, labels = csgraph.connected_components(graph, directed=False)
+    # Link the lowest node of every other component to ground
+    roots = np.unique(labels[1:], return_index=True)[1] + 1
+    roots = roots[labels[roots] != labels[0]]
+    graph = graph + sparse.coo_matrix((np.ones(len(roots)), (np.zeros(len(roots), dtype=np.int64), roots)),
+                                      shape=graph.shape).tocsr()
+    distance = csgraph.shortest_path(graph, directed=False, unweighted=True, indices=0)
+    row = distance.astype(np.int64) - 1
+
+    order = np.lexsort((np.arange(num_nodes + 1), row))
+    column = np.empty(num_nodes + 1, dtype=np.int64)
+    first = np.searchsorted(row[order], row[order])
+    column[order] = np.arange(num_nodes + 1) - first
+    return row, column
+
+
+class CircuitView:
+    # Schematic on a scrollable canvas. Every node keeps the position it got
+    # when it first appeared (or from layered_layout when a whole circuit is
+    # loaded), adding an element only creates its own canvas items, and only
+    # elements inside the visible area (plus a margin) have canvas items at
+    # all: a grid of cells maps areas to elements, so a redraw after a scroll
+    # only looks at the cells in view.
+
+    radius = 20
+    x_spacing = 150
+    y_spacing = 100
+    cell = 400
+    max_cells = 16
+    margin = 200
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.clear()
+
+    def clear(self):
+        self.canvas.delete("all")
+        self.elements = []
+        self.positions = {}
+        self.rows = {}
+        self.row_sizes = defaultdict(int)
+        self.shapes = {}
+        self.cells = defaultdict(set)
+        self.long = set()
+        self.drawn = {}
+        self.extent = (0, 0)
+        self.scrollregion = None
+
+    def _place(self, node, row, column):
+        x = 50 + column * self.x_spacing
+        y = 50 + row * self.y_spacing
+        self.positions[node] = (x, y)
+        self.rows[node] = row
+        self.row_sizes[row] = max(self.row_sizes[row], column + 1)
+        self._add_shape(("node", node), (x - self.radius, y - self.radius, x + self.radius, y + self.radius))
+
+    def _add_shape(self, key, bbox):
+        self.shapes[key] = bbox
+        columns = range(int(bbox[0] // self.cell), int(bbox[2] // self.cell) + 1)
+        rows = range(int(bbox[1] // self.cell), int(bbox[3] // self.cell) + 1)
+        if len(columns) * len(rows) > self.max_cells:
+            # Long wires across the schematic are checked on every redraw
+            # instead of filling hundreds of cells
+            self.long.add(key)
+        else:
+            for cx in columns:
+                for cy in rows:
+                    self.cells[cx, cy].add(key)
+        self.extent = (max(self.extent[0], bbox[2] + 50), max(self.extent[1], bbox[3] + 50))
+
+    def _element_points(self, kind, n1, n2):
+        if n1 == 0:
+            n1, n2 = n2, n1
+        x1, y1 = self.positions[n1]
+        if n2 == 0:
+            x2, y2 = (x1 + 50, y1 + 50) if kind == "R" else (x1 + 50, y1 - 50)
+        else:
+            x2, y2 = self.positions[n2]
+        offset = 20 if kind == "R" else -20
+        mid_x, mid_y = (x1 + x2) / 2 + offset, (y1 + y2) / 2 - offset
+        return x1, y1, mid_x, mid_y, x2, y2
+
+    def _add_element_shape(self, kind, value, n1, n2):
+        self.elements.append((kind, value, n1, n2))
+        if n1 == 0 and n2 == 0:
+            return
+        x1, y1, mid_x, mid_y, x2, y2 = self._element_points(kind, n1, n2)
+        self._add_shape(("element", len(self.elements) - 1),
+                        (min(x1, mid_x, x2) - 30, min(y1, mid_y - 20, y2), max(x1, mid_x, x2) + 30, max(y1, mid_y, y2)))
+
+    def add_element(self, kind, value, n1, n2):
+        # kind is "R" or "E"; a new node goes to the end of the row below its
+        # neighbour (row 0 next to ground)
+        for node, other in ((n1, n2), (n2, n1)):
+            if node != 0 and node not in self.positions:
+                row = self.rows[other] + 1 if other in self.rows else 0
+                self._place(node, row, self.row_sizes[row])
+        self._add_element_shape(kind, value, n1, n2)
+        self.refresh()
+
+    def set_elements(self, elements):
+        # Replaces the whole schematic, laid out once by layered_layout
+        self.clear()
+        num_nodes = max([0] + [n for e in elements for n in e[2:]])
+        row, column = layered_layout(elements, num_nodes)
+        for node in sorted({n for e in elements for n in e[2:]} - {0}):
+            self._place(node, int(row[node]), int(column[node]))
+        for kind, value, n1, n2 in elements:
+            self._add_element_shape(kind, value, n1, n2)
+        self.refresh()
+
+    def _draw(self, key):
+        canvas = self.canvas
+        if key[0] == "node":
+            x, y = self.positions[key[1]]
+            r = self.radius
+            return [canvas.create_oval(x - r, y - r, x + r, y + r, fill="lightblue", tags="node"),
+                    canvas.create_text(x, y, text=str(key[1]), tags="node")]
+        kind, value, n1, n2 = self.elements[key[1]]
+        x1, y1, mid_x, mid_y, x2, y2 = self._element_points(kind, n1, n2)
+        if kind == "R":
+            return [canvas.create_line(x1, y1, mid_x, mid_y, x2, y2, fill="black"),
+                    canvas.create_text(mid_x, mid_y - 10, text=f"R={value}")]
+        return [canvas.create_line(x1, y1, mid_x, mid_y, x2, y2, fill="red", dash=(4, 2)),
+                canvas.create_text(mid_x, mid_y - 10, text=f"E={value}", fill="red")]
+
+    def refresh(self, *_):
+        canvas = self.canvas
+        scrollregion = (0, 0) + self.extent
+        if scrollregion != self.scrollregion:
+            self.scrollregion = scrollregion
+            canvas.configure(scrollregion=scrollregion)
+        left = canvas.canvasx(0) - self.margin
+        top = canvas.canvasy(0) - self.margin
+        right = canvas.canvasx(canvas.winfo_width()) + self.margin
+        bottom = canvas.canvasy(canvas.winfo_height()) + self.margin
+
+        visible = set(self.long)
+        for cx in range(int(left // self.cell), int(right // self.cell) + 1):
+            for cy in range(int(top // self.cell), int(bottom // self.cell) + 1):
+                visible.update(self.cells.get((cx, cy), ()))
+        visible = {key for key in visible if self.shapes[key][0] <= right and self.shapes[key][2] >= left
+                   and self.shapes[key][1] <= bottom and self.shapes[key][3] >= top}
+
+        for key in set(self.drawn) - visible:
+            canvas.delete(*self.drawn.pop(key))
+        new = visible - set(self.drawn)
+        for key in new:
+            self.drawn[key] = self._draw(key)
+        if new:
+            # Nodes stay on top of the wires
+            canvas.tag_raise("node")
+
 
 def solve_circuit_gui():
     def add_resistor():
@@ -10,8 +179,7 @@ def solve_circuit_gui():
             n2 = int(entry_r_node2.get())
             resistors.append((r, n1, n2))
             listbox_resistors.insert(tk.END, f"R: {r} Ом, узлы: {n1}-{n2}")
-            update_max_node()
-            draw_circuit()
+            view.add_element("R", r, n1, n2)
         except ValueError:
             messagebox.showerror("Ошибка", "Введите корректные значения для резистора.")
 
@@ -22,8 +190,7 @@ def solve_circuit_gui():
             n2 = int(entry_v_node2.get())
             sources.append((v, n1, n2))
             listbox_sources.insert(tk.END, f"E: {v} В, узлы: {n1}-{n2}")
-            update_max_node()
-            draw_circuit()
+            view.add_element("E", v, n1, n2)
         except ValueError:
             messagebox.showerror("Ошибка", "Введите корректные значения для источника.")
 
@@ -39,98 +206,45 @@ def solve_circuit_gui():
                 messagebox.showerror("Ошибка", "Нет узлов для расчета.")
                 return
 
-            G, I = create_admittance_matrix(resistors, sources, num_nodes)
-
-            potentials = np.linalg.solve(G, I)
+            potentials, currents, source_currents = solve_circuit(resistors, sources, num_nodes,
+                                                                  reuse_factorization=True, source_currents=True)
 
             result_text = "Рассчитанные потенциалы узлов:\n"
             for i, p in enumerate(potentials):
                 result_text += f"Узел {i+1}: {p:.4f} В\n"
 
             result_text += "\nТоки через резисторы:\n"
-            for i, (r, n1, n2) in enumerate(resistors):
-                v1 = potentials[n1-1] if n1 != 0 else 0
-                v2 = potentials[n2-1] if n2 != 0 else 0
-                current = (v1 - v2) / r 
+            for i, current in enumerate(currents):
                 result_text += f"I{i+1}: {current:.4f} A\n"
 
+            result_text += "\nТоки через источники:\n"
+            for i, current in enumerate(source_currents):
+                result_text += f"Iv{i+1}: {current:.4f} A\n"
+
             messagebox.showinfo("Результат", result_text)
 
         except ValueError:
             messagebox.showerror("Ошибка", "Введите корректные параметры схемы.")
-        except np.linalg.LinAlgError:
-            messagebox.showerror("Ошибка", "Матрица проводимостей вырождена. Проверьте конфигурацию схемы.")
-
-    def create_admittance_matrix(resistors, sources, num_nodes):
-        G = np.zeros((num_nodes, num_nodes))
-        I = np.zeros(num_nodes)
-
-        for r, n1, n2 in resistors:
-            g = 1 / r
-            if n1 != 0:
-                G[n1-1, n1-1] += g
-            if n2 != 0:
-                G[n2-1, n2-1] += g
-            if n1 != 0 and n2 != 0:
-                G[n1-1, n2-1] -= g
-                G[n2-1, n1-1] -= g
-
-        for v, n1, n2 in sources:
-            if n1 != 0:
-                I[n1-1] += v
-            if n2 != 0:
-                I[n2-1] -= v
-
-        return G, I
-
-    def update_max_node():
-        nonlocal max_node
-        max_node = max([0] + [n for _, n1, n2 in resistors + sources for n in (n1, n2)])
-        draw_circuit()
-
-    def draw_circuit():
-        canvas.delete("all")
-        node_positions = {}
-        radius = 20
-
-        x_spacing = 150
-        y_spacing = 100
-
-        rows = (max_node + 3) // 4
-        for n in range(1, max_node + 1):
-            row = (n - 1) // 4
-            col = (n - 1) % 4
-            x = 50 + col * x_spacing
-            y = 50 + row * y_spacing
-            node_positions[n] = (x, y)
-            canvas.create_oval(x - radius, y - radius, x + radius, y + radius, fill="lightblue")
-            canvas.create_text(x, y, text=str(n))
-
-        for r, n1, n2 in resistors:
-            x1, y1 = node_positions.get(n1, (0, 0))
-            x2, y2 = node_positions.get(n2, (0, 0))
-            if n1 == 0 or n2 == 0:
-                x2, y2 = (x1 + 50, y1 + 50)
-
-            mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
-            offset = 20
-            canvas.create_line(x1, y1, mid_x + offset, mid_y - offset, fill="black")
-            canvas.create_line(mid_x + offset, mid_y - offset, x2, y2, fill="black")
-
-            canvas.create_text(mid_x + offset, mid_y - offset - 10, text=f"R={r}")
-
-        for v, n1, n2 in sources:
-            x1, y1 = node_positions.get(n1, (0, 0))
-            x2, y2 = node_positions.get(n2, (0, 0))
-            if n1 == 0 or n2 == 0:
-                x2, y2 = (x1 + 50, y1 - 50)
-
-            mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
-            offset = -20
-            canvas.create_line(x1, y1, mid_x + offset, mid_y - offset, fill="red", dash=(4, 2))
-            canvas.create_line(mid_x + offset, mid_y - offset, x2, y2, fill="red", dash=(4, 2))
-
-            canvas.create_text(mid_x + offset, mid_y - offset - 10, text=f"E={v}", fill="red")
+        except np.linalg.LinAlgError as error:
+            messagebox.showerror("Ошибка", f"Матрица проводимостей вырождена. Проверьте конфигурацию схемы.\n{error}")
+
+    def load_netlist():
+        path = filedialog.askopenfilename(filetypes=[("Списки соединений", "*.cir *.net *.sp *.txt"),
+                                                     ("Все файлы", "*")])
+        if not path:
+            return
+        try:
+            netlist = read_netlist(path)
+        except (OSError, ValueError) as error:
+            messagebox.showerror("Ошибка", f"Не удалось прочитать файл: {error}")
+            return
+        resistors[:] = netlist.resistors
+        sources[:] = netlist.sources
+        listbox_resistors.delete(0, tk.END)
+        listbox_sources.delete(0, tk.END)
+        listbox_resistors.insert(tk.END, *[f"R: {r} Ом, узлы: {n1}-{n2}" for r, n1, n2 in resistors])
+        listbox_sources.insert(tk.END, *[f"E: {v} В, узлы: {n1}-{n2}" for v, n1, n2 in sources])
+        view.set_elements([("R",) + r for r in resistors] + [("E",) + v for v in sources])
 
     root = tk.Tk()
     root.title("Расчет электрической схемы")
@@ -138,8 +252,6 @@ def solve_circuit_gui():
     resistors = []
     sources = []
 
-    max_node = 0
-
     frame_resistors = tk.LabelFrame(root, text="Резисторы")
     frame_resistors.grid(row=0, column=0, padx=10, pady=10)
 
@@ -180,10 +292,28 @@ def solve_circuit_gui():
     listbox_sources = tk.Listbox(frame_sources, width=40, height=10)
     listbox_sources.grid(row=4, column=0, columnspan=2)
 
-    tk.Button(root, text="Рассчитать", command=calculate).grid(row=1, column=0, columnspan=2, pady=10)
+    tk.Button(root, text="Рассчитать", command=calculate).grid(row=1, column=0, pady=10)
+    tk.Button(root, text="Загрузить из файла", command=load_netlist).grid(row=1, column=1, pady=10)
+
+    frame_canvas = tk.Frame(root)
+    frame_canvas.grid(row=2, column=0, columnspan=2, pady=10)
+    canvas = Canvas(frame_canvas, width=800, height=400, bg="white")
+    canvas.grid(row=0, column=0)
+    scroll_x = tk.Scrollbar(frame_canvas, orient=tk.HORIZONTAL, command=canvas.xview)
+    scroll_x.grid(row=1, column=0, sticky="ew")
+    scroll_y = tk.Scrollbar(frame_canvas, orient=tk.VERTICAL, command=canvas.yview)
+    scroll_y.grid(row=0, column=1, sticky="ns")
+
+    view = CircuitView(canvas)
+
+    def on_scroll(scrollbar):
+        def update(first, last):
+            scrollbar.set(first, last)
+            view.refresh()
+        return update
 
-    canvas = Canvas(root, width=800, height=400, bg="white")
-    canvas.grid(row=2, column=0, columnspan=2, pady=10)
+    canvas.configure(xscrollcommand=on_scroll(scroll_x), yscrollcommand=on_scroll(scroll_y))
+    canvas.bind("<Configure>", view.refresh)
 
     root.mainloop()
 
@@ -1,6 +1,9 @@
 import wx
 import matplotlib.pyplot as plt
-import numpy as np
+from matplotlib.collections import LineCollection
+
+from FieldEngine import IncrementalField
+from FieldLines import trace_field_lines
 
 class ElectricFieldApp(wx.Frame):
     def __init__(self):
@@ -23,6 +26,9 @@ class ElectricFieldApp(wx.Frame):
         self.charges_sizer = wx.BoxSizer(wx.VERTICAL)
         self.sizer.Add(self.charges_sizer, 1, wx.EXPAND | wx.ALL, 10)
         
+        # Cached field, only edited sources are recomputed
+        self.field = IncrementalField(x_range=(-5, 5), y_range=(-5, 5))
+
         self.charge_inputs = []
         self.add_charge_input(panel)
         
@@ -75,33 +81,15 @@ class ElectricFieldApp(wx.Frame):
             self.plot_field(charges)
 
     def plot_field(self, charges):
-
-        def calculate_field(charges, x_range, y_range, grid_size=100):
-            k_e = 8.987551787e9
-            x = np.linspace(*x_range, grid_size)
-            y = np.linspace(*y_range, grid_size)
-            X, Y = np.meshgrid(x, y)
-            Ex = np.zeros_like(X)
-            Ey = np.zeros_like(Y)
-            Phi = np.zeros_like(X)
-
-            for (x_c, y_c, q) in charges:
-                r = np.sqrt((X - x_c)**2 + (Y - y_c)**2)
-                r_hat_x = (X - x_c) / r
-                r_hat_y = (Y - y_c) / r
-                r[r == 0] = np.inf
-                Ex += k_e * q * r_hat_x / r**2
-                Ey += k_e * q * r_hat_y / r**2
-                Phi += k_e * q / r
-            return X, Y, Ex, Ey, Phi
-
-        X, Y, Ex, Ey, Phi = calculate_field(charges, x_range=(-5, 5), y_range=(-5, 5))
+        self.field.update(charges)
+        X, Y, Ex, Ey, Phi = self.field.fields()
 
         fig, ax = plt.subplots(figsize=(8, 6))
         
         ax.quiver(X, Y, Ex, Ey, color='blue', pivot='middle', scale=1e12, width=0.002, label='Векторное поле')
         
-        ax.streamplot(X, Y, Ex, Ey, color=np.sqrt(Ex**2 + Ey**2), cmap="viridis", density=1.5, linewidth=1)
+        field_lines = trace_field_lines(charges, x_range=(-5, 5), y_range=(-5, 5))
+        ax.add_collection(LineCollection(field_lines, colors="darkgreen", linewidths=1))
         
         contour = ax.contour(X, Y, Phi, levels=20, colors="red", linewidths=0.8)
         ax.clabel(contour, inline=1, fontsize=8, fmt="%.1e")
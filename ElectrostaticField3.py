@@ -1,7 +1,11 @@
 import wx
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 
+from FieldEngine import IncrementalField, dipole_forces
+from FieldLines import trace_field_lines
+
 class ElectricFieldApp(wx.Frame):
     def __init__(self):
         super().__init__(None, title="Электростатическое поле точечных зарядов", size=(700, 600))
@@ -38,6 +42,9 @@ class ElectricFieldApp(wx.Frame):
         self.sizer.Add(wx.StaticText(panel, label="Результаты:"), 0, wx.ALL, 5)
         self.sizer.Add(self.results_display, 0, wx.EXPAND | wx.ALL, 10)
 
+        # Cached field, only edited sources are recomputed
+        self.field = IncrementalField(x_range=(-5, 5), y_range=(-5, 5))
+
         self.charge_inputs = []
         self.dipole_inputs = []
 
@@ -136,66 +143,23 @@ class ElectricFieldApp(wx.Frame):
 
     def plot_field(self, charges, dipoles):
 
-        def calculate_field(charges, x_range, y_range, grid_size=100):
-            k_e = 8.987551787e9
-            x = np.linspace(*x_range, grid_size)
-            y = np.linspace(*y_range, grid_size)
-            X, Y = np.meshgrid(x, y)
-            Ex = np.zeros_like(X)
-            Ey = np.zeros_like(Y)
-            Phi = np.zeros_like(X)
-
-            for (x_c, y_c, q) in charges:
-                r = np.sqrt((X - x_c)**2 + (Y - y_c)**2)
-                r_hat_x = (X - x_c) / r
-                r_hat_y = (Y - y_c) / r
-                r[r == 0] = np.inf
-                Ex += k_e * q * r_hat_x / r**2
-                Ey += k_e * q * r_hat_y / r**2
-                Phi += k_e * q / r
-
-            for (x_d, y_d, p, theta) in dipoles:
-                r = np.sqrt((X - x_d)**2 + (Y - y_d)**2)
-                r_hat_x = (X - x_d) / r
-                r_hat_y = (Y - y_d) / r
-                r[r == 0] = np.inf
-
-                px = p * np.cos(theta)
-                py = p * np.sin(theta)
-
-                p_dot_r = px * r_hat_x + py * r_hat_y
-
-                Ex += k_e * (3 * p_dot_r * r_hat_x - px) / r**3
-                Ey += k_e * (3 * p_dot_r * r_hat_y - py) / r**3    
-            return X, Y, Ex, Ey, Phi
-
-        def calculate_dipole_force_moment(dipole, Ex, Ey, X, Y):
-            x, y, p, theta = dipole
-            idx = (np.abs(X[0] - x)).argmin()
-            idy = (np.abs(Y[:, 0] - y)).argmin()
-
-            E_dipole = np.array([Ex[idy, idx], Ey[idy, idx]])
-            p_vector = np.array([p * np.cos(theta), p * np.sin(theta)])
-            
-            force = E_dipole * p
-            torque = np.cross(p_vector, E_dipole)
-            return force, torque
-
-        X, Y, Ex, Ey, Phi = calculate_field(charges, x_range=(-5, 5), y_range=(-5, 5))
+        self.field.update(charges, dipoles)
+        X, Y, Ex, Ey, Phi = self.field.fields()
 
         fig, ax = plt.subplots(figsize=(8, 6))
         ax.quiver(X, Y, Ex, Ey, color='blue', pivot='middle', scale=1e12, width=0.002, label='Векторное поле')
-        ax.streamplot(X, Y, Ex, Ey, color=np.sqrt(Ex**2 + Ey**2), cmap="viridis", density=1.5, linewidth=1)
+        field_lines = trace_field_lines(charges, x_range=(-5, 5), y_range=(-5, 5), dipoles=dipoles)
+        ax.add_collection(LineCollection(field_lines, colors="darkgreen", linewidths=1))
         contour = ax.contour(X, Y, Phi, levels=20, colors="red", linewidths=0.8)
         ax.clabel(contour, inline=1, fontsize=8, fmt="%.1e")
         filled_contour = ax.contourf(X, Y, Phi, levels=50, cmap="RdYlBu", alpha=0.8)
         plt.colorbar(filled_contour, label="Потенциал (В)")
 
         results = []
+        forces, torques = dipole_forces(dipoles, charges)
 
-        for dipole in dipoles:
+        for dipole, force, torque in zip(dipoles, forces, torques):
             x, y, p, theta = dipole
-            force, torque = calculate_dipole_force_moment(dipole, Ex, Ey, X, Y)
             ax.arrow(x, y, 0.2 * np.cos(theta), 0.2 * np.sin(theta), head_width=0.1, color='magenta', label='Диполь')
             results.append(f"Диполь в ({x:.1f}, {y:.1f}): Сила = {force}, Момент = {torque:.2e}")
 
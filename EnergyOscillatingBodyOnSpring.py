@@ -1,12 +1,19 @@
 import wx
 import numpy as np
-from scipy.integrate import solve_ivp
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 
+from SpringChain import chain_stiffness, simulate_chain
+from SpringSolver import integrate_oscillators, spring_energies
+
+# Choices of the calculation method: label and integrate_oscillators method
+# (None for the closed-form solution)
+METHODS = [("Точное решение", None), ("Скоростной метод Верле", "verlet"), ("Метод Йошиды 4-го порядка", "yoshida4"),
+           ("Метод Йошиды 6-го порядка", "yoshida6")]
+
 class EnergyPlotApp(wx.Frame):
     def __init__(self, parent, title):
-        super(EnergyPlotApp, self).__init__(parent, title=title, size=(400, 300))
+        super(EnergyPlotApp, self).__init__(parent, title=title, size=(400, 420))
 
         panel = wx.Panel(self)
 
@@ -19,7 +26,17 @@ class EnergyPlotApp(wx.Frame):
         wx.StaticText(panel, label="Коэффициент сопротивления среды:", pos=(20, 100))
         self.damping_input = wx.TextCtrl(panel, pos=(230, 100))
 
-        plot_button = wx.Button(panel, label="Построить графики", pos=(20, 150))
+        wx.StaticText(panel, label="Метод расчета:", pos=(20, 140))
+        self.method_choice = wx.Choice(panel, pos=(150, 135), choices=[name for name, _ in METHODS])
+        self.method_choice.SetSelection(0)
+
+        wx.StaticText(panel, label="Шаг интегрирования (с):", pos=(20, 180))
+        self.step_input = wx.TextCtrl(panel, value="0.01", pos=(230, 180))
+
+        wx.StaticText(panel, label="Число масс в цепочке:", pos=(20, 220))
+        self.count_input = wx.TextCtrl(panel, value="1", pos=(230, 220))
+
+        plot_button = wx.Button(panel, label="Построить графики", pos=(20, 270))
         plot_button.Bind(wx.EVT_BUTTON, self.on_plot)
 
         self.Show()
@@ -35,31 +52,51 @@ class EnergyPlotApp(wx.Frame):
                               "Ошибка ввода", wx.OK | wx.ICON_ERROR)
                 return
             
-            self.plot_energy_graphs(m, k, b)
+            method = METHODS[self.method_choice.GetSelection()][1]
+            dt = float(self.step_input.GetValue())
+            count = int(self.count_input.GetValue())
+            if (method is not None or count > 1) and not 0 < dt <= 1:
+                wx.MessageBox("Шаг должен быть в пределах от 0 до 1 с.", "Ошибка ввода", wx.OK | wx.ICON_ERROR)
+                return
+            if count < 1:
+                wx.MessageBox("Число масс должно быть положительным.", "Ошибка ввода", wx.OK | wx.ICON_ERROR)
+                return
+
+            if count > 1:
+                self.plot_chain_energy_graphs(m, k, b, count, method or "yoshida4", dt)
+            else:
+                self.plot_energy_graphs(m, k, b, method, dt)
             
         except ValueError:
             wx.MessageBox("Введите корректные значения.", "Ошибка ввода", wx.OK | wx.ICON_ERROR)
 
-    def plot_energy_graphs(self, m, k, b):
-        def equation(t, y):
-            x, v = y
-            dxdt = v
-            dvdt = -(b / m) * v - (k / m) * x
-            return [dxdt, dvdt]
-
-        y0 = [1.0, 0.0]
-        t_span = (0, 20)
-        t_eval = np.linspace(0, 20, 500)
-
-        solution = solve_ivp(equation, t_span, y0, t_eval=t_eval)
-        x = solution.y[0]
-        v = solution.y[1]
-        t = solution.t
-
-        kinetic_energy = m * v**2 / 2
-        potential_energy = k * x**2 / 2
-        total_energy = kinetic_energy + potential_energy
-
+    def plot_energy_graphs(self, m, k, b, method=None, dt=0.01):
+        # Linear damped oscillator: energies straight from the closed form,
+        # or from a fixed-step integrator with step dt
+        if method is None:
+            t = np.linspace(0, 20, 500)
+            kinetic_energy, potential_energy, total_energy = spring_energies(t, m, k, b)
+        else:
+            t, x, v = integrate_oscillators(m, k, b, 20, dt, method, record_every=max(1, int(20 / dt) // 2000))
+            kinetic_energy = m * v**2 / 2
+            potential_energy = k * x**2 / 2
+            total_energy = kinetic_energy + potential_energy
+        self.show_energy_graphs(t, kinetic_energy, potential_energy, total_energy)
+
+    def plot_chain_energy_graphs(self, m, k, b, count, method, dt):
+        # Chain of count equal masses between two walls, the first one
+        # displaced by 1 m; energies summed over the chain
+        try:
+            t, x, kinetic, potential = simulate_chain(chain_stiffness(k, count), m, b, np.eye(1, count)[0], 0.0, 20,
+                                                      dt, method, record_every=max(1, int(20 / dt) // 2000))
+        except ValueError as error:
+            wx.MessageBox(str(error), "Ошибка ввода", wx.OK | wx.ICON_ERROR)
+            return
+        kinetic_energy = kinetic.sum(axis=1)
+        potential_energy = potential.sum(axis=1)
+        self.show_energy_graphs(t, kinetic_energy, potential_energy, kinetic_energy + potential_energy)
+
+    def show_energy_graphs(self, t, kinetic_energy, potential_energy, total_energy):
         fig, axs = plt.subplots(3, 1, figsize=(8, 10))
         plt.subplots_adjust(hspace=0.4)
         fig.suptitle("Зависимость энергий от времени")
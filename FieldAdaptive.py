@@ -0,0 +1,133 @@
+import numpy as np
+
+from FieldEngine import DEFAULT_MEMORY_LIMIT, field_at_points, make_grid, source_arrays
+
+
+class AdaptiveMesh:
+    # Quadtree of cells over the rectangle x_range x y_range. Every vertex of
+    # every cell lies on a lattice with base_cells * 2**max_level cells per
+    # axis, so a vertex shared by neighbouring or nested cells is evaluated
+    # once. A cell is split when bilinear interpolation from its corners
+    # misses Phi or E at its centre by more than tolerance (relative).
+
+    def __init__(self, charges, x_range, y_range, dipoles=(), base_cells=16, max_level=6, tolerance=1e-2,
+                 memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.charges, self.dipoles = source_arrays(charges, dipoles)
+        self.x_range = x_range
+        self.y_range = y_range
+        self.base_cells = int(base_cells)
+        self.max_level = int(max_level)
+        self.tolerance = tolerance
+        self.memory_limit = memory_limit
+
+        self.lattice = self.base_cells * 2**self.max_level
+        self.keys = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, 3))
+        self.refined = []
+        self._refine()
+
+    @property
+    def evaluations(self):
+        return len(self.keys)
+
+    def _key(self, i, j):
+        return j.astype(np.int64) * (self.lattice + 1) + i
+
+    def _evaluate(self, i, j):
+        keys = np.unique(self._key(i, j))
+        new = keys[~np.isin(keys, self.keys, assume_unique=True)]
+        if len(new):
+            ni = new % (self.lattice + 1)
+            nj = new // (self.lattice + 1)
+            px = self.x_range[0] + (self.x_range[1] - self.x_range[0]) * ni / self.lattice
+            py = self.y_range[0] + (self.y_range[1] - self.y_range[0]) * nj / self.lattice
+            Ex, Ey, Phi = field_at_points(self.charges, px, py, self.dipoles, self.memory_limit)
+            keys = np.concatenate([self.keys, new])
+            order = np.argsort(keys)
+            self.keys = keys[order]
+            self.values = np.concatenate([self.values, np.column_stack([Ex, Ey, Phi])])[order]
+
+    def _lookup(self, i, j):
+        return self.values[np.searchsorted(self.keys, self._key(i, j))]
+
+    def _corners(self, level, ci, cj):
+        step = 2**(self.max_level - level)
+        i0, j0 = ci * step, cj * step
+        return [self._lookup(i0, j0), self._lookup(i0 + step, j0),
+                self._lookup(i0, j0 + step), self._lookup(i0 + step, j0 + step)]
+
+    def _refine(self):
+        n = self.base_cells
+        ci, cj = [c.ravel() for c in np.meshgrid(np.arange(n), np.arange(n))]
+        step = 2**self.max_level
+        ii, jj = [c.ravel() for c in np.meshgrid(np.arange(n + 1) * step, np.arange(n + 1) * step)]
+        self._evaluate(ii, jj)
+        scale = np.median(np.abs(self.values), axis=0)
+        e_scale = np.hypot(scale[0], scale[1])
+
+        for level in range(self.max_level):
+            step = 2**(self.max_level - level)
+            half = step // 2
+            centre_i = ci * step + half
+            centre_j = cj * step + half
+            self._evaluate(centre_i, centre_j)
+
+            centre = self._lookup(centre_i, centre_j)
+            estimate = sum(self._corners(level, ci, cj)) / 4
+            phi_error = np.abs(centre[:, 2] - estimate[:, 2]) / (np.abs(centre[:, 2]) + scale[2])
+            e_error = (np.hypot(centre[:, 0] - estimate[:, 0], centre[:, 1] - estimate[:, 1])
+                       / (np.hypot(centre[:, 0], centre[:, 1]) + e_scale))
+            split = (phi_error > self.tolerance) | (e_error > self.tolerance)
+
+            ci, cj = ci[split], cj[split]
+            self.refined.append(np.sort(cj.astype(np.int64) * (n * 2**level) + ci))
+            if len(ci) == 0:
+                break
+
+            i0, j0 = ci * step, cj * step
+            self._evaluate(np.concatenate([i0 + half, i0 + half, i0, i0 + step]),
+                           np.concatenate([j0, j0 + step, j0 + half, j0 + half]))
+            ci = np.concatenate([2 * ci, 2 * ci + 1, 2 * ci, 2 * ci + 1])
+            cj = np.concatenate([2 * cj, 2 * cj, 2 * cj + 1, 2 * cj + 1])
+
+    def sample(self, px, py):
+        px = np.asarray(px, dtype=float).ravel()
+        py = np.asarray(py, dtype=float).ravel()
+        u = np.clip((px - self.x_range[0]) / (self.x_range[1] - self.x_range[0]), 0, 1)
+        v = np.clip((py - self.y_range[0]) / (self.y_range[1] - self.y_range[0]), 0, 1)
+
+        # Walk every point down to the leaf cell that contains it
+        level = np.zeros(len(px), dtype=int)
+        active = np.arange(len(px))
+        for depth, refined in enumerate(self.refined):
+            n = self.base_cells * 2**depth
+            ci = np.minimum((u[active] * n).astype(np.int64), n - 1)
+            cj = np.minimum((v[active] * n).astype(np.int64), n - 1)
+            codes = cj * n + ci
+            pos = np.minimum(np.searchsorted(refined, codes), max(len(refined) - 1, 0))
+            inside = refined[pos] == codes if len(refined) else np.zeros(len(codes), dtype=bool)
+            active = active[inside]
+            level[active] += 1
+
+        n = self.base_cells * 2**level
+        ci = np.minimum((u * n).astype(np.int64), n - 1)
+        cj = np.minimum((v * n).astype(np.int64), n - 1)
+        tx = (u * n - ci)[:, None]
+        ty = (v * n - cj)[:, None]
+        step = 2**(self.max_level - level)
+        i0, j0 = ci * step, cj * step
+        f00, f10, f01, f11 = (self._lookup(i0, j0), self._lookup(i0 + step, j0),
+                              self._lookup(i0, j0 + step), self._lookup(i0 + step, j0 + step))
+        result = (1 - tx) * (1 - ty) * f00 + tx * (1 - ty) * f10 + (1 - tx) * ty * f01 + tx * ty * f11
+        return result[:, 0], result[:, 1], result[:, 2]
+
+    def resample(self, grid_size=100):
+        X, Y = make_grid(self.x_range, self.y_range, grid_size)
+        Ex, Ey, Phi = self.sample(X, Y)
+        return X, Y, Ex.reshape(X.shape), Ey.reshape(X.shape), Phi.reshape(X.shape)
+
+
+def calculate_field_adaptive(charges, x_range, y_range, grid_size=100, dipoles=(), base_cells=16, max_level=6,
+                             tolerance=1e-2, memory_limit=DEFAULT_MEMORY_LIMIT):
+    mesh = AdaptiveMesh(charges, x_range, y_range, dipoles, base_cells, max_level, tolerance, memory_limit)
+    return mesh.resample(grid_size)
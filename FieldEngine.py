@@ -0,0 +1,420 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+K_E = 8.987551787e9
+
+# Upper bound on the scratch memory used by one broadcast block (sources x points)
+DEFAULT_MEMORY_LIMIT = 256 * 2**20
+# Number of float64 temporaries alive per (source, point) pair inside a block
+_PAIR_BYTES = 8 * 8
+# Blocks larger than this stop fitting in cache and only add page faults
+_CACHE_PAIRS = 2**14
+_SOURCE_CHUNK = 64
+
+
+def make_grid(x_range, y_range, grid_size=100, dtype=np.float64):
+    x = np.linspace(*x_range, grid_size, dtype=dtype)
+    y = np.linspace(*y_range, grid_size, dtype=dtype)
+    return np.meshgrid(x, y)
+
+
+def source_arrays(charges=(), dipoles=(), dtype=np.float64):
+    charges = np.asarray(charges, dtype=dtype).reshape(-1, 3)
+    dipoles = np.asarray(dipoles, dtype=dtype).reshape(-1, 4)
+    return charges, dipoles
+
+
+def _block_sizes(n_sources, n_points, memory_limit):
+    pairs = max(1, min(int(memory_limit) // _PAIR_BYTES, _CACHE_PAIRS))
+    source_chunk = max(1, min(n_sources, _SOURCE_CHUNK, pairs))
+    point_chunk = max(1, min(n_points, pairs // source_chunk))
+    return source_chunk, point_chunk
+
+
+def _inverse_distance(px, py, xs, ys):
+    dx = px[None, :] - xs[:, None]
+    dy = py[None, :] - ys[:, None]
+    inv_r2 = dx * dx
+    inv_r2 += dy * dy
+    # A grid node lying exactly on a source gets no contribution from it
+    np.divide(1.0, inv_r2, out=inv_r2, where=inv_r2 > 0)
+    return dx, dy, inv_r2
+
+
+def _accumulate_charges(charges, px, py, Ex, Ey, Phi):
+    dx, dy, inv_r2 = _inverse_distance(px, py, charges[:, 0], charges[:, 1])
+    q = K_E * charges[:, 2]
+    inv_r3 = np.sqrt(inv_r2)
+    Phi += q @ inv_r3
+    inv_r3 *= inv_r2
+    dx *= inv_r3
+    dy *= inv_r3
+    Ex += q @ dx
+    Ey += q @ dy
+
+
+def _accumulate_dipoles(dipoles, px, py, Ex, Ey, Phi):
+    dx, dy, inv_r2 = _inverse_distance(px, py, dipoles[:, 0], dipoles[:, 1])
+    p_x = K_E * dipoles[:, 2] * np.cos(dipoles[:, 3])
+    p_y = K_E * dipoles[:, 2] * np.sin(dipoles[:, 3])
+    inv_r3 = np.sqrt(inv_r2)
+    inv_r3 *= inv_r2
+    p_dot_r = p_x[:, None] * dx
+    p_dot_r += p_y[:, None] * dy
+    p_dot_r *= inv_r3
+    Phi += p_dot_r.sum(axis=0)
+    # p_dot_r now holds 3 (p . r) / r^5
+    p_dot_r *= inv_r2
+    p_dot_r *= 3
+    Ex += (p_dot_r * dx).sum(axis=0) - p_x @ inv_r3
+    Ey += (p_dot_r * dy).sum(axis=0) - p_y @ inv_r3
+
+
+def _accumulate_charge_gradient(charges, px, py, Exx, Exy, Eyy):
+    dx, dy, inv_r2 = _inverse_distance(px, py, charges[:, 0], charges[:, 1])
+    q = K_E * charges[:, 2]
+    inv_r3 = np.sqrt(inv_r2)
+    inv_r3 *= inv_r2
+    # three_inv_r5 = 3 / r^5
+    three_inv_r5 = 3 * inv_r3 * inv_r2
+    Exx += q @ inv_r3 - q @ (three_inv_r5 * dx * dx)
+    Eyy += q @ inv_r3 - q @ (three_inv_r5 * dy * dy)
+    Exy -= q @ (three_inv_r5 * dx * dy)
+
+
+def _accumulate_dipole_gradient(dipoles, px, py, Exx, Exy, Eyy):
+    dx, dy, inv_r2 = _inverse_distance(px, py, dipoles[:, 0], dipoles[:, 1])
+    p_x = K_E * dipoles[:, 2] * np.cos(dipoles[:, 3])
+    p_y = K_E * dipoles[:, 2] * np.sin(dipoles[:, 3])
+    inv_r5 = np.sqrt(inv_r2)
+    inv_r5 *= inv_r2 * inv_r2
+    p_dot_r = p_x[:, None] * dx + p_y[:, None] * dy
+    # dE_i/dx_j = 3 (p_i r_j + p_j r_i + (p . r) delta_ij) / r^5 - 15 (p . r) r_i r_j / r^7
+    radial = 15 * p_dot_r * inv_r5 * inv_r2
+    Exx += (3 * (2 * p_x[:, None] * dx + p_dot_r) * inv_r5 - radial * dx * dx).sum(axis=0)
+    Eyy += (3 * (2 * p_y[:, None] * dy + p_dot_r) * inv_r5 - radial * dy * dy).sum(axis=0)
+    Exy += (3 * (p_x[:, None] * dy + p_y[:, None] * dx) * inv_r5 - radial * dx * dy).sum(axis=0)
+
+
+def _accumulate_blocked(sources, px, py, accumulate, outputs, memory_limit):
+    if len(sources) == 0:
+        return
+    source_chunk, point_chunk = _block_sizes(len(sources), len(px), memory_limit)
+    for start in range(0, len(px), point_chunk):
+        points = slice(start, start + point_chunk)
+        for s_start in range(0, len(sources), source_chunk):
+            accumulate(sources[s_start:s_start + source_chunk], px[points], py[points],
+                       *(output[points] for output in outputs))
+
+
+def field_at_points(charges, px, py, dipoles=(), memory_limit=DEFAULT_MEMORY_LIMIT, out=None):
+    # Works in float32 when the outputs (or, without out, the points) are float32
+    if out is not None:
+        dtype = out[0].dtype
+    else:
+        dtype = np.result_type(np.asarray(px).dtype, np.float32)
+    charges, dipoles = source_arrays(charges, dipoles, dtype)
+    px = np.asarray(px, dtype=dtype).ravel()
+    py = np.asarray(py, dtype=dtype).ravel()
+    if out is None:
+        out = (np.zeros_like(px), np.zeros_like(px), np.zeros_like(px))
+
+    _accumulate_blocked(charges, px, py, _accumulate_charges, out, memory_limit)
+    _accumulate_blocked(dipoles, px, py, _accumulate_dipoles, out, memory_limit)
+    return out
+
+
+def field_gradient_at_points(charges, px, py, dipoles=(), memory_limit=DEFAULT_MEMORY_LIMIT):
+    # Returns Ex, Ey, Phi and the field gradient dEx/dx, dEx/dy (= dEy/dx), dEy/dy
+    charges, dipoles = source_arrays(charges, dipoles)
+    px = np.asarray(px, dtype=float).ravel()
+    py = np.asarray(py, dtype=float).ravel()
+    Ex, Ey, Phi = field_at_points(charges, px, py, dipoles, memory_limit)
+    gradient = (np.zeros_like(px), np.zeros_like(px), np.zeros_like(px))
+
+    _accumulate_blocked(charges, px, py, _accumulate_charge_gradient, gradient, memory_limit)
+    _accumulate_blocked(dipoles, px, py, _accumulate_dipole_gradient, gradient, memory_limit)
+    return (Ex, Ey, Phi) + gradient
+
+
+def interpolate_field(X, Y, Ex, Ey, px, py):
+    # Bilinear interpolation of a field already computed on a make_grid grid;
+    # the gradient is interpolated from central differences of the grid
+    x = X[0]
+    y = Y[:, 0]
+    px = np.asarray(px, dtype=float).ravel()
+    py = np.asarray(py, dtype=float).ravel()
+    i = np.clip(np.searchsorted(x, px) - 1, 0, len(x) - 2)
+    j = np.clip(np.searchsorted(y, py) - 1, 0, len(y) - 2)
+    tx = np.clip((px - x[i]) / (x[i + 1] - x[i]), 0, 1)
+    ty = np.clip((py - y[j]) / (y[j + 1] - y[j]), 0, 1)
+
+    def bilinear(F):
+        return ((1 - tx) * (1 - ty) * F[j, i] + tx * (1 - ty) * F[j, i + 1]
+                + (1 - tx) * ty * F[j + 1, i] + tx * ty * F[j + 1, i + 1])
+
+    dEx_dy, dEx_dx = np.gradient(Ex, y, x)
+    dEy_dy, dEy_dx = np.gradient(Ey, y, x)
+    return (bilinear(Ex), bilinear(Ey), bilinear(dEx_dx),
+            bilinear(0.5 * (dEx_dy + dEy_dx)), bilinear(dEy_dy))
+
+
+def dipole_forces(dipoles, charges=(), memory_limit=DEFAULT_MEMORY_LIMIT, grid=None):
+    # Force F = (p . grad) E and torque tau_z = p x E on every dipole from all
+    # charges and the other dipoles. With grid=(X, Y, Ex, Ey) the external
+    # field is interpolated from that grid instead of being summed over the
+    # sources; such a grid must not contain the dipoles' own fields.
+    charges, dipoles = source_arrays(charges, dipoles)
+    x_d, y_d = dipoles[:, 0], dipoles[:, 1]
+    p_x = dipoles[:, 2] * np.cos(dipoles[:, 3])
+    p_y = dipoles[:, 2] * np.sin(dipoles[:, 3])
+
+    if grid is None:
+        # Each dipole sits at r = 0 of its own field, which the kernel skips
+        Ex, Ey, _, Exx, Exy, Eyy = field_gradient_at_points(charges, x_d, y_d, dipoles, memory_limit)
+    else:
+        Ex, Ey, Exx, Exy, Eyy = interpolate_field(*grid, x_d, y_d)
+
+    forces = np.column_stack([p_x * Exx + p_y * Exy, p_x * Exy + p_y * Eyy])
+    torques = p_x * Ey - p_y * Ex
+    return forces, torques
+
+
+def _evaluate(charges, px, py, dipoles, out, method, theta, memory_limit, tree=None):
+    if method == "direct":
+        field_at_points(charges, px, py, dipoles, memory_limit, out=out)
+    elif method == "tree":
+        from FieldTree import tree_field_at_points
+        tree_field_at_points(charges, px, py, dipoles, theta, memory_limit=memory_limit, out=out, tree=tree)
+    else:
+        raise ValueError(f"Неизвестный метод расчета поля: {method}")
+
+
+def _tile_rows(n_rows, workers):
+    # A few tiles per worker keeps the pool busy when tiles finish unevenly
+    step = max(1, -(-n_rows // (4 * workers)))
+    return [(start, min(start + step, n_rows)) for start in range(0, n_rows, step)]
+
+
+_worker_state = {}
+
+
+def _init_worker(shm_name, shape, dtype, x, y, charges, dipoles, method, theta, memory_limit):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    tree = None
+    if method == "tree":
+        from FieldTree import QuadTree
+        tree = QuadTree(charges, dipoles)
+    _worker_state.update(shm=shm, fields=np.ndarray((3,) + shape, dtype=dtype, buffer=shm.buf), x=x, y=y,
+                         charges=charges, dipoles=dipoles, method=method, theta=theta,
+                         memory_limit=memory_limit, tree=tree)
+
+
+def _process_tile(rows):
+    state = _worker_state
+    _fill_tile(state["fields"], state["x"], state["y"], rows, state["charges"], state["dipoles"],
+               state["method"], state["theta"], state["memory_limit"], state["tree"])
+
+
+def _fill_tile(fields, x, y, rows, charges, dipoles, method, theta, memory_limit, tree):
+    start, stop = rows
+    X, Y = np.meshgrid(x, y[start:stop])
+    out = tuple(field[start:stop].reshape(-1) for field in fields)
+    _evaluate(charges, X.ravel(), Y.ravel(), dipoles, out, method, theta, memory_limit, tree)
+
+
+def _calculate_parallel(charges, dipoles, x, y, Ex, Ey, Phi, method, theta, memory_limit, workers, backend):
+    charges, dipoles = source_arrays(charges, dipoles)
+    tiles = _tile_rows(len(y), workers)
+
+    if backend == "thread":
+        tree = None
+        if method == "tree":
+            from FieldTree import QuadTree
+            tree = QuadTree(charges, dipoles)
+        fields = (Ex, Ey, Phi)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda rows: _fill_tile(fields, x, y, rows, charges, dipoles,
+                                                  method, theta, memory_limit, tree), tiles))
+        return
+
+    if backend != "process":
+        raise ValueError(f"Неизвестный тип пула: {backend}")
+
+    # Workers write their tiles straight into shared memory, so only the
+    # row ranges travel through the pool
+    shape = Ex.shape
+    shm = shared_memory.SharedMemory(create=True, size=3 * Ex.nbytes)
+    try:
+        fields = np.ndarray((3,) + shape, dtype=Ex.dtype, buffer=shm.buf)
+        fields[:] = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, shape, Ex.dtype, x, y, charges, dipoles,
+                                           method, theta, memory_limit)) as pool:
+            list(pool.map(_process_tile, tiles))
+        Ex[:] = fields[0]
+        Ey[:] = fields[1]
+        Phi[:] = fields[2]
+        del fields
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def calculate_field(charges, x_range, y_range, grid_size=100, dipoles=(), memory_limit=DEFAULT_MEMORY_LIMIT,
+                    method="direct", theta=0.5, workers=1, backend="process", dtype=np.float64):
+    X, Y = make_grid(x_range, y_range, grid_size, dtype)
+    Ex = np.zeros_like(X)
+    Ey = np.zeros_like(Y)
+    Phi = np.zeros_like(X)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1:
+        _calculate_parallel(charges, dipoles, X[0], Y[:, 0], Ex, Ey, Phi, method, theta, memory_limit,
+                            workers, backend)
+    else:
+        _evaluate(charges, X.ravel(), Y.ravel(), dipoles, (Ex.reshape(-1), Ey.reshape(-1), Phi.reshape(-1)),
+                  method, theta, memory_limit)
+    return X, Y, Ex, Ey, Phi
+
+
+def calculate_field_to_disk(charges, x_range, y_range, directory, grid_size=100, dipoles=(), dtype=np.float32,
+                            tile_memory=64 * 2**20, memory_limit=DEFAULT_MEMORY_LIMIT, method="direct", theta=0.5):
+    # Out-of-core variant of calculate_field: Ex, Ey and Phi go to Ex.npy,
+    # Ey.npy and Phi.npy in directory (plus the axes in x.npy and y.npy),
+    # filled in row tiles so only one tile is ever held in memory.
+    # Returns x, y and read-only memory maps of the three fields.
+    os.makedirs(directory, exist_ok=True)
+    x = np.linspace(*x_range, grid_size, dtype=dtype)
+    y = np.linspace(*y_range, grid_size, dtype=dtype)
+    np.save(os.path.join(directory, "x.npy"), x)
+    np.save(os.path.join(directory, "y.npy"), y)
+
+    names = ("Ex", "Ey", "Phi")
+    fields = [np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+", dtype=dtype,
+                                        shape=(grid_size, grid_size)) for name in names]
+    # X and Y of a tile plus the three output rows
+    rows = max(1, int(tile_memory) // (5 * grid_size * np.dtype(dtype).itemsize))
+
+    charges, dipoles = source_arrays(charges, dipoles)
+    tree = None
+    if method == "tree":
+        from FieldTree import QuadTree
+        tree = QuadTree(charges, dipoles)
+
+    for start in range(0, grid_size, rows):
+        tile = (start, min(start + rows, grid_size))
+        _fill_tile(fields, x, y, tile, charges, dipoles, method, theta, memory_limit, tree)
+        for field in fields:
+            field.flush()
+    del fields
+
+    return (x, y) + tuple(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in names)
+
+
+class IncrementalField:
+    # Keeps Ex, Ey, Phi of the current sources on a fixed grid. Since the
+    # field is linear in the sources, an edit only adds the contribution of
+    # the changed sources (removals are added with the opposite sign).
+    # A full rebuild every rebuild_every edits bounds the round-off that
+    # repeated add/subtract cycles leave behind near the sources.
+
+    def __init__(self, x_range, y_range, grid_size=100, memory_limit=DEFAULT_MEMORY_LIMIT, rebuild_every=1000):
+        self.X, self.Y = make_grid(x_range, y_range, grid_size)
+        self.Ex = np.zeros_like(self.X)
+        self.Ey = np.zeros_like(self.X)
+        self.Phi = np.zeros_like(self.X)
+        self.memory_limit = memory_limit
+        self.rebuild_every = rebuild_every
+        self.charges = []
+        self.dipoles = []
+        self.edits = 0
+
+    def fields(self):
+        return self.X, self.Y, self.Ex, self.Ey, self.Phi
+
+    def _apply(self, charges, dipoles, sign=1.0):
+        charges, dipoles = source_arrays(charges, dipoles)
+        if len(charges) == 0 and len(dipoles) == 0:
+            return
+        charges = charges * [1, 1, sign]
+        dipoles = dipoles * [1, 1, sign, 1]
+        field_at_points(charges, self.X.ravel(), self.Y.ravel(), dipoles, self.memory_limit,
+                        out=(self.Ex.reshape(-1), self.Ey.reshape(-1), self.Phi.reshape(-1)))
+
+    def _edited(self, count=1):
+        self.edits += count
+        if self.edits >= self.rebuild_every:
+            self.rebuild()
+
+    def rebuild(self):
+        self.Ex[:] = 0
+        self.Ey[:] = 0
+        self.Phi[:] = 0
+        self._apply(self.charges, self.dipoles)
+        self.edits = 0
+
+    def add_charge(self, x, y, q):
+        self.charges.append((x, y, q))
+        self._apply([(x, y, q)], ())
+        self._edited()
+
+    def remove_charge(self, index=-1):
+        charge = self.charges.pop(index)
+        self._apply([charge], (), -1.0)
+        self._edited()
+        return charge
+
+    def move_charge(self, index, x, y):
+        old = self.charges[index]
+        self.charges[index] = (x, y, old[2])
+        self._apply([old], (), -1.0)
+        self._apply([self.charges[index]], ())
+        self._edited()
+
+    def add_dipole(self, x, y, p, theta):
+        self.dipoles.append((x, y, p, theta))
+        self._apply((), [(x, y, p, theta)])
+        self._edited()
+
+    def remove_dipole(self, index=-1):
+        dipole = self.dipoles.pop(index)
+        self._apply((), [dipole], -1.0)
+        self._edited()
+        return dipole
+
+    def move_dipole(self, index, x, y, theta=None):
+        old = self.dipoles[index]
+        self.dipoles[index] = (x, y, old[2], old[3] if theta is None else theta)
+        self._apply((), [old], -1.0)
+        self._apply((), [self.dipoles[index]])
+        self._edited()
+
+    def update(self, charges=(), dipoles=()):
+        # Brings the cache to exactly these sources, touching only the
+        # entries that differ from the cached lists
+        charges = [tuple(map(float, c)) for c in charges]
+        dipoles = [tuple(map(float, d)) for d in dipoles]
+        old_charges, new_charges = Counter(self.charges), Counter(charges)
+        old_dipoles, new_dipoles = Counter(self.dipoles), Counter(dipoles)
+        removed_charges = list((old_charges - new_charges).elements())
+        added_charges = list((new_charges - old_charges).elements())
+        removed_dipoles = list((old_dipoles - new_dipoles).elements())
+        added_dipoles = list((new_dipoles - old_dipoles).elements())
+
+        changes = len(removed_charges) + len(added_charges) + len(removed_dipoles) + len(added_dipoles)
+        self.charges = charges
+        self.dipoles = dipoles
+        if changes == 0:
+            return
+        if changes >= len(charges) + len(dipoles) or self.edits + changes >= self.rebuild_every:
+            self.rebuild()
+            return
+        self._apply(removed_charges, removed_dipoles, -1.0)
+        self._apply(added_charges, added_dipoles)
+        self.edits += changes
@@ -0,0 +1,202 @@
+import numpy as np
+
+from FieldEngine import K_E, DEFAULT_MEMORY_LIMIT, field_at_points, make_grid, source_arrays
+
+DEFAULT_THETA = 0.5
+DEFAULT_LEAF_SIZE = 64
+_MAX_DEPTH = 48
+
+
+class QuadTree:
+    # Barnes-Hut quadtree over point charges and dipoles.
+    # Every cell stores a Cartesian expansion of its sources about the cell
+    # centre up to the quadrupole term: Q, D = (Dx, Dy), M = (Mxx, Mxy, Myy).
+
+    def __init__(self, charges=(), dipoles=(), leaf_size=DEFAULT_LEAF_SIZE):
+        charges, dipoles = source_arrays(charges, dipoles)
+        self.charges = charges
+        self.dipoles = dipoles
+
+        positions = np.concatenate([charges[:, :2], dipoles[:, :2]])
+        q = np.concatenate([charges[:, 2], np.zeros(len(dipoles))])
+        p = np.zeros((len(positions), 2))
+        p[len(charges):, 0] = dipoles[:, 2] * np.cos(dipoles[:, 3])
+        p[len(charges):, 1] = dipoles[:, 2] * np.sin(dipoles[:, 3])
+        is_dipole = np.arange(len(positions)) >= len(charges)
+
+        self.leaf_size = max(1, int(leaf_size))
+        self.centers = []
+        self.radii = []
+        self.moments = []
+        self.abs_charge = []
+        self.abs_dipole = []
+        self.children = []
+        self.leaves = {}
+
+        if len(positions):
+            lo = positions.min(axis=0)
+            hi = positions.max(axis=0)
+            half = max(0.5 * (hi - lo).max(), 1e-12)
+            self._build(np.arange(len(positions)), 0.5 * (lo + hi), half, 0,
+                        positions, q, p, is_dipole)
+
+        self.centers = np.array(self.centers).reshape(-1, 2)
+        self.radii = np.array(self.radii)
+        self.moments = np.array(self.moments).reshape(-1, 6)
+        self.abs_charge = np.array(self.abs_charge)
+        self.abs_dipole = np.array(self.abs_dipole)
+
+    def __len__(self):
+        return len(self.radii)
+
+    def _build(self, idx, center, half, depth, positions, q, p, is_dipole):
+        node = len(self.radii)
+        d = positions[idx] - center
+        qi = q[idx]
+        pi = p[idx]
+        d_dot_p = d[:, 0] * pi[:, 0] + d[:, 1] * pi[:, 1]
+        d2 = d[:, 0]**2 + d[:, 1]**2
+
+        Q = qi.sum()
+        Dx = (qi * d[:, 0]).sum() + pi[:, 0].sum()
+        Dy = (qi * d[:, 1]).sum() + pi[:, 1].sum()
+        Mxx = (qi * (3 * d[:, 0]**2 - d2) / 2).sum() + (3 * d[:, 0] * pi[:, 0] - d_dot_p).sum()
+        Myy = (qi * (3 * d[:, 1]**2 - d2) / 2).sum() + (3 * d[:, 1] * pi[:, 1] - d_dot_p).sum()
+        Mxy = (qi * 3 * d[:, 0] * d[:, 1] / 2).sum() + (1.5 * (d[:, 0] * pi[:, 1] + d[:, 1] * pi[:, 0])).sum()
+
+        self.centers.append(center)
+        self.radii.append(np.sqrt(d2.max()))
+        self.moments.append((Q, Dx, Dy, Mxx, Mxy, Myy))
+        self.abs_charge.append(np.abs(qi).sum())
+        self.abs_dipole.append(np.hypot(pi[:, 0], pi[:, 1]).sum())
+        self.children.append([])
+
+        if len(idx) <= self.leaf_size or depth >= _MAX_DEPTH:
+            n_charges = len(self.charges)
+            leaf_charges = self.charges[idx[~is_dipole[idx]]]
+            leaf_dipoles = self.dipoles[idx[is_dipole[idx]] - n_charges]
+            self.leaves[node] = (leaf_charges, leaf_dipoles)
+            return node
+
+        quadrant = (d[:, 0] >= 0).astype(int) + 2 * (d[:, 1] >= 0)
+        for k in range(4):
+            sub = idx[quadrant == k]
+            if len(sub) == 0:
+                continue
+            offset = np.array([1.0 if k & 1 else -1.0, 1.0 if k & 2 else -1.0]) * half / 2
+            child = self._build(sub, center + offset, half / 2, depth + 1, positions, q, p, is_dipole)
+            self.children[node].append(child)
+        return node
+
+
+def _series_constants(theta):
+    # Sums of (j + 4) theta^j and (j + 4)^2 theta^j over j >= 0, used to bound
+    # the tail of the multipole series once the quadrupole term is dropped
+    c1 = 4 / (1 - theta) + theta / (1 - theta)**2
+    c2 = theta * (1 + theta) / (1 - theta)**3 + 8 * theta / (1 - theta)**2 + 16 / (1 - theta)
+    return c1, c2
+
+
+def _evaluate_expansion(moments, Rx, Ry, Ex, Ey, Phi):
+    Q, Dx, Dy, Mxx, Mxy, Myy = moments
+    r2 = Rx**2 + Ry**2
+    inv_r = 1 / np.sqrt(r2)
+    inv_r2 = inv_r * inv_r
+    inv_r3 = inv_r2 * inv_r
+    inv_r5 = inv_r3 * inv_r2
+
+    D_dot_R = Dx * Rx + Dy * Ry
+    MRx = Mxx * Rx + Mxy * Ry
+    MRy = Mxy * Rx + Myy * Ry
+    RMR = Rx * MRx + Ry * MRy
+
+    Phi += K_E * (Q * inv_r + D_dot_R * inv_r3 + RMR * inv_r5)
+    radial = Q * inv_r3 + 3 * D_dot_R * inv_r5 + 5 * RMR * inv_r5 * inv_r2
+    Ex += K_E * (radial * Rx - Dx * inv_r3 - 2 * MRx * inv_r5)
+    Ey += K_E * (radial * Ry - Dy * inv_r3 - 2 * MRy * inv_r5)
+
+
+def tree_field_at_points(charges, px, py, dipoles=(), theta=DEFAULT_THETA, leaf_size=DEFAULT_LEAF_SIZE,
+                         memory_limit=DEFAULT_MEMORY_LIMIT, out=None, tree=None, return_bound=False):
+    if not 0 < theta < 1:
+        raise ValueError("Параметр точности theta должен лежать в интервале (0, 1).")
+    if tree is None:
+        tree = QuadTree(charges, dipoles, leaf_size)
+
+    px = np.asarray(px, dtype=float).ravel()
+    py = np.asarray(py, dtype=float).ravel()
+    if out is None:
+        out = (np.zeros_like(px), np.zeros_like(px), np.zeros_like(px))
+    Ex, Ey, Phi = out
+    phi_bound = np.zeros_like(px)
+    e_bound = np.zeros_like(px)
+    c1, c2 = _series_constants(theta)
+
+    stack = [(0, np.arange(len(px)))] if len(tree) else []
+    while stack:
+        node, targets = stack.pop()
+        Rx = px[targets] - tree.centers[node, 0]
+        Ry = py[targets] - tree.centers[node, 1]
+        r = np.hypot(Rx, Ry)
+        far = tree.radii[node] < theta * r
+
+        if far.any():
+            sel = targets[far]
+            ex = np.zeros(len(sel))
+            ey = np.zeros(len(sel))
+            phi = np.zeros(len(sel))
+            _evaluate_expansion(tree.moments[node], Rx[far], Ry[far], ex, ey, phi)
+            Ex[sel] += ex
+            Ey[sel] += ey
+            Phi[sel] += phi
+
+            rf = r[far]
+            u = tree.radii[node] / rf
+            a_q = tree.abs_charge[node]
+            a_p = tree.abs_dipole[node]
+            phi_bound[sel] += K_E * (a_q * u**3 / (1 - theta) / rf + a_p * c1 * u**2 / rf**2)
+            e_bound[sel] += K_E * (a_q * c1 * u**3 / rf**2 + a_p * c2 * u**2 / rf**3)
+
+        near = targets[~far]
+        if len(near) == 0:
+            continue
+        if node in tree.leaves:
+            leaf_charges, leaf_dipoles = tree.leaves[node]
+            ex, ey, phi = field_at_points(leaf_charges, px[near], py[near], leaf_dipoles, memory_limit)
+            Ex[near] += ex
+            Ey[near] += ey
+            Phi[near] += phi
+        else:
+            for child in tree.children[node]:
+                stack.append((child, near))
+
+    if return_bound:
+        return Ex, Ey, Phi, phi_bound, e_bound
+    return Ex, Ey, Phi
+
+
+def tree_error_report(charges, x_range, y_range, grid_size=100, dipoles=(), theta=DEFAULT_THETA,
+                      leaf_size=DEFAULT_LEAF_SIZE, sample_size=1000, seed=0):
+    # Compares the tree result with the direct sum on a random sample of grid
+    # nodes and reports it next to the guaranteed per-node bound
+    X, Y = make_grid(x_range, y_range, grid_size)
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(X.size, size=min(sample_size, X.size), replace=False)
+    px = X.ravel()[sample]
+    py = Y.ravel()[sample]
+
+    Ex, Ey, Phi, phi_bound, e_bound = tree_field_at_points(
+        charges, px, py, dipoles, theta, leaf_size, return_bound=True)
+    Ex_d, Ey_d, Phi_d = field_at_points(charges, px, py, dipoles)
+
+    phi_error = np.abs(Phi - Phi_d)
+    e_error = np.hypot(Ex - Ex_d, Ey - Ey_d)
+    return {
+        "theta": theta,
+        "max_phi_error": phi_error.max(),
+        "max_phi_bound": phi_bound.max(),
+        "max_e_error": e_error.max(),
+        "max_e_bound": e_bound.max(),
+        "bound_holds": bool(np.all(phi_error <= phi_bound * (1 + 1e-9) + 1e-12 * np.abs(Phi_d))
+                            and np.all(e_error <= e_bound * (1 + 1e-9) + 1e-12 * np.hypot(Ex_d, Ey_d))),
+    }
@@ -1,9 +1,10 @@
 import wx
 import numpy as np
-from scipy.integrate import solve_ivp
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 
+from ProjectileSolver import DEFAULT_DENSITY_HEIGHT, trajectory
+
 class ProjectileApp(wx.Frame):
     def __init__(self, parent, title):
         super(ProjectileApp, self).__init__(parent, title=title, size=(400, 400))
@@ -22,7 +23,13 @@ class ProjectileApp(wx.Frame):
         wx.StaticText(panel, label="Коэффициент сопротивление среды (k):", pos=(20, 140))
         self.resistance_input = wx.TextCtrl(panel, pos=(250, 140))
 
-        plot_button = wx.Button(panel, label="Построить график", pos=(20, 200))
+        wx.StaticText(panel, label="Сопротивление:", pos=(20, 180))
+        self.drag_choice = wx.Choice(panel, pos=(200, 175), choices=["Линейное (-kv)", "Квадратичное (-k|v|v)"])
+        self.drag_choice.SetSelection(0)
+
+        self.density_check = wx.CheckBox(panel, label="Плотность воздуха убывает с высотой", pos=(20, 215))
+
+        plot_button = wx.Button(panel, label="Построить график", pos=(20, 260))
         plot_button.Bind(wx.EVT_BUTTON, self.on_plot)
 
         self.Show()
@@ -40,35 +47,23 @@ class ProjectileApp(wx.Frame):
                               "Ошибка ввода", wx.OK | wx.ICON_ERROR)
                 return
 
-            self.plot_trajectory(initial_speed, launch_angle, initial_height, air_resistance)
+            drag = ("linear", "quadratic")[self.drag_choice.GetSelection()]
+            density_height = DEFAULT_DENSITY_HEIGHT if self.density_check.GetValue() else np.inf
+            self.plot_trajectory(initial_speed, launch_angle, initial_height, air_resistance, drag, density_height)
 
         except ValueError:
             wx.MessageBox("Некорректный ввод.", "Ошибка ввода", wx.OK | wx.ICON_ERROR)
 
-    def plot_trajectory(self, initial_speed, launch_angle, initial_height, air_resistance):
-        g = 10
-
-        launch_angle_rad = np.radians(launch_angle)
-        v_x0 = initial_speed * np.cos(launch_angle_rad)
-        v_y0 = initial_speed * np.sin(launch_angle_rad)
-
-        def equations(t, y):
-            x, y_pos, v_x, v_y = y
-            speed = np.sqrt(v_x**2 + v_y**2)
-            dv_xdt = -air_resistance * v_x
-            dv_ydt = -g - air_resistance * v_y
-            return [v_x, v_y, dv_xdt, dv_ydt]
-
-        y0 = [0, initial_height, v_x0, v_y0]
-        t_span = (0, 10)
-        t_eval = np.linspace(0, 10, 500)
-
-        solution = solve_ivp(equations, t_span, y0, t_eval=t_eval, method="RK45")
-        x = solution.y[0]
-        y_pos = solution.y[1]
-        v_x = solution.y[2]
-        v_y = solution.y[3]
-        t = solution.t
+    def plot_trajectory(self, initial_speed, launch_angle, initial_height, air_resistance, drag="linear",
+                        density_height=np.inf):
+        # The flight ends at the impact with the ground (event y = 0), the
+        # output points follow the solver's steps
+        t, solution, landing = trajectory(initial_speed, launch_angle, initial_height, air_resistance,
+                                          drag=drag, density_height=density_height)
+        x = solution[0]
+        y_pos = solution[1]
+        v_x = solution[2]
+        v_y = solution[3]
 
         speed = np.sqrt(v_x**2 + v_y**2)
 
@@ -77,6 +72,12 @@ class ProjectileApp(wx.Frame):
         fig.suptitle("Движения тела с учетом сопротивления воздуха")
 
         axs[0].plot(x, y_pos, label="Траектория")
+        if landing is None:
+            axs[0].set_title("Тело не упало за время расчета")
+        else:
+            axs[0].plot(landing.distance, 0, "o", color='black', label="Точка падения")
+            axs[0].set_title(f"Дальность {landing.distance:.3f} м, время полета {landing.time:.3f} с, "
+                             f"скорость при падении {landing.speed:.3f} м/с")
         axs[0].set_xlabel("X, м")
         axs[0].set_ylabel("Y, м")
         axs[0].set_ylim(bottom=0)
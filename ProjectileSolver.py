@@ -0,0 +1,466 @@
+import csv
+from collections import namedtuple
+
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.special import lambertw
+
+G = 10
+DEFAULT_CHUNK_SIZE = 2**16
+DEFAULT_POINTS_PER_STEP = 4
+_NEWTON_STEPS = 30
+# Below this value of k t the drag terms are taken from their series
+_SERIES_LIMIT = 1e-3
+# Scale height of the exponential atmosphere, m
+DEFAULT_DENSITY_HEIGHT = 8500.0
+# Half-width (degrees) of the bracket around a neighbour's optimal angle
+DEFAULT_WARM_WIDTH = 2.0
+
+Landing = namedtuple("Landing", ["time", "distance", "speed"])
+Envelope = namedtuple("Envelope", ["speed", "k", "angle", "distance", "apex", "flight_time", "max_height"])
+
+# Dormand-Prince 5(4) tableau; the last stage is evaluated at the new point
+_C = (0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1)
+_A = ((), (1 / 5,), (3 / 40, 9 / 40), (44 / 45, -56 / 15, 32 / 9),
+      (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+      (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+      (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84))
+# Difference between the 5th and the embedded 4th order weights
+_E = (71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+
+def linear_drag(state, k, g=G, density_height=np.inf):
+    # state is (4, N): x, y, v_x, v_y of N bodies; drag force -k v per unit
+    # mass, k scaled by the air density exp(-y / density_height)
+    x, y, v_x, v_y = state
+    f = k * np.exp(-y / density_height)
+    return np.stack([v_x, v_y, -f * v_x, -g - f * v_y])
+
+
+def quadratic_drag(state, k, g=G, density_height=np.inf):
+    # Drag force -k |v| v per unit mass, k scaled by the air density
+    x, y, v_x, v_y = state
+    f = k * np.exp(-y / density_height) * np.hypot(v_x, v_y)
+    return np.stack([v_x, v_y, -f * v_x, -g - f * v_y])
+
+
+def linear_drag_jacobian(state, k, g=G, density_height=np.inf):
+    # d rhs / d state, (4, 4) for one body or (4, 4, N)
+    x, y, v_x, v_y = state
+    f = k * np.exp(-y / density_height)
+    J = np.zeros((4, 4) + np.shape(x))
+    J[0, 2] = J[1, 3] = 1
+    J[2, 1] = f * v_x / density_height
+    J[3, 1] = f * v_y / density_height
+    J[2, 2] = J[3, 3] = -f
+    return J
+
+
+def quadratic_drag_jacobian(state, k, g=G, density_height=np.inf):
+    x, y, v_x, v_y = state
+    f = k * np.exp(-y / density_height)
+    speed = np.hypot(v_x, v_y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cross = np.where(speed > 0, f * v_x * v_y / speed, 0.0)
+        xx = np.where(speed > 0, f * (speed + v_x**2 / speed), 0.0)
+        yy = np.where(speed > 0, f * (speed + v_y**2 / speed), 0.0)
+    J = np.zeros((4, 4) + np.shape(x))
+    J[0, 2] = J[1, 3] = 1
+    J[2, 1] = f * speed * v_x / density_height
+    J[3, 1] = f * speed * v_y / density_height
+    J[2, 2], J[2, 3] = -xx, -cross
+    J[3, 2], J[3, 3] = -cross, -yy
+    return J
+
+
+# Right-hand side and its Jacobian for each drag model
+DRAG_MODELS = {
+    "linear": (linear_drag, linear_drag_jacobian),
+    "quadratic": (quadratic_drag, quadratic_drag_jacobian),
+}
+
+
+def _drag_model(drag):
+    if drag not in DRAG_MODELS:
+        raise ValueError(f"Неизвестная модель сопротивления: {drag}")
+    return DRAG_MODELS[drag]
+
+
+def initial_state(speed, angle, height=0.0):
+    # angle in degrees; returns a (4, N) state array
+    speed, angle, height = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (speed, angle, height)))
+    angle = np.radians(angle.ravel())
+    return np.stack([np.zeros(angle.size), height.ravel(), speed.ravel() * np.cos(angle),
+                     speed.ravel() * np.sin(angle)])
+
+
+# Continuous extension of Dormand-Prince (as in Hairer's DOPRI5): row i
+# holds the coefficients of s, s^2, s^3, s^4 for stage i
+_P = ((1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432),
+      (0, 0, 0, 0),
+      (0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799),
+      (0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072),
+      (0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632),
+      (0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844),
+      (0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423))
+
+
+def _interpolate(coefficients, s):
+    # Value and derivative (per unit s) of sum c_j s^j, j = 1.., minus the
+    # value at s = 0
+    value = np.zeros_like(s)
+    slope = np.zeros_like(s)
+    for c in reversed(coefficients):
+        slope = slope * s + value + c
+        value = (value + c) * s
+    return value, slope
+
+
+def _crossing(start, coefficients, guess):
+    # Root in [0, 1] of start + interpolant, by Newton iterations from guess
+    s = guess
+    for _ in range(_NEWTON_STEPS):
+        value, slope = _interpolate(coefficients, s)
+        change = (start + value) / np.where(slope == 0, -1.0, slope)
+        s = np.clip(s - change, 0, 1)
+        if np.all(np.abs(change) < 1e-15):
+            break
+    return s
+
+
+def _step(rhs, state, params, h, method):
+    # One step of every body; returns the new state, the error estimate
+    # (None for the fixed-step RK4) and the coefficients of the interpolant
+    # over the step, (order, 4, N) for powers 1.. of the step fraction
+    if method == "rk4":
+        k1 = rhs(state, *params)
+        k2 = rhs(state + h / 2 * k1, *params)
+        k3 = rhs(state + h / 2 * k2, *params)
+        k4 = rhs(state + h * k3, *params)
+        new = state + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        # Cubic Hermite through both ends with the derivatives there
+        m0, m1 = h * k1, h * rhs(new, *params)
+        change = new - state
+        return new, None, np.stack([m0, 3 * change - 2 * m0 - m1, -2 * change + m0 + m1])
+    k = [rhs(state, *params)]
+    for a in _A[1:]:
+        k.append(rhs(state + h * sum(c * ki for c, ki in zip(a, k) if c), *params))
+    new = state + h * sum(c * ki for c, ki in zip(_A[6], k) if c)
+    coefficients = np.stack([h * sum(p[j] * ki for p, ki in zip(_P, k) if p[j]) for j in range(4)])
+    return new, h * sum(c * ki for c, ki in zip(_E, k) if c), coefficients
+
+
+def integrate_to_ground(rhs, state, params=(), method="rk45", dt=1e-3, rtol=1e-8, atol=1e-8, t_max=1e4):
+    # Advances all bodies of the (4, N) state together until each one comes
+    # down to y = 0, every body with its own step for "rk45" (Dormand-Prince,
+    # step chosen from rtol/atol) or with the fixed step dt for "rk4".
+    # params are arrays of per-body parameters passed on to rhs. The impact
+    # and the apex inside a step are found on the interpolant of the step
+    # (the continuous extension of Dormand-Prince, cubic Hermite for RK4),
+    # so they keep the accuracy of the integrator.
+    # Returns range, apex height and flight time per body (nan if the body
+    # is still in the air at t_max).
+    if method not in ("rk4", "rk45"):
+        raise ValueError(f"Неизвестный метод интегрирования: {method}")
+    n = state.shape[1]
+    state = state.copy()
+    params = [np.broadcast_to(np.asarray(p, dtype=float), (n,)) for p in params]
+    t = np.zeros(n)
+    h = np.full(n, float(dt))
+    apex = state[1].copy()
+    distance = np.full(n, np.nan)
+    flight_time = np.full(n, np.nan)
+    active = np.arange(n)
+
+    while len(active):
+        s = state[:, active]
+        hh = np.minimum(h[active], t_max - t[active])
+        new, error, coefficients = _step(rhs, s, [p[active] for p in params], hh, method)
+
+        if error is None:
+            accepted = np.ones(len(active), dtype=bool)
+        else:
+            scale = atol + rtol * np.maximum(np.abs(s), np.abs(new))
+            norm = np.abs(error / scale).max(axis=0)
+            accepted = norm <= 1
+            factor = np.clip(0.9 * np.maximum(norm, 1e-10)**-0.2, 0.2, 5.0)
+            h[active] = hh * factor
+
+        idx = active[accepted]
+        s, new, hh, coefficients = s[:, accepted], new[:, accepted], hh[accepted], coefficients[:, :, accepted]
+        y0, y1, vy0, vy1 = s[1], new[1], s[3], new[3]
+
+        # Apex inside the step: v_y changes sign
+        turning = (vy0 > 0) & (vy1 <= 0)
+        frac = _crossing(vy0[turning], coefficients[:, 3, turning], vy0[turning] / (vy0[turning] - vy1[turning]))
+        top = y0[turning] + _interpolate(coefficients[:, 1, turning], frac)[0]
+        apex[idx[turning]] = np.maximum(apex[idx[turning]], top)
+        apex[idx] = np.maximum(apex[idx], y1)
+
+        # Impact: y comes down through zero. A body launched from y = 0 has
+        # a root at the start of its first step too, so it starts from the
+        # end of the step
+        landed = y1 < 0
+        guess = np.where(y0[landed] > 0, y0[landed] / (y0[landed] - y1[landed]), 1.0)
+        frac = _crossing(y0[landed], coefficients[:, 1, landed], guess)
+        flight_time[idx[landed]] = t[idx[landed]] + frac * hh[landed]
+        distance[idx[landed]] = s[0, landed] + _interpolate(coefficients[:, 0, landed], frac)[0]
+
+        state[:, idx] = new
+        t[idx] += hh
+        done = np.zeros(n, dtype=bool)
+        done[idx[landed]] = True
+        done[active[t[active] >= t_max]] = True
+        active = active[~done[active]]
+
+    return distance, apex, flight_time
+
+
+def _drag_time(t, k):
+    # tau = (1 - e^(-k t)) / k and (t - tau) / k, both finite as k -> 0
+    kt = k * t
+    series = np.abs(kt) < _SERIES_LIMIT
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tau = np.where(series, t * (1 - kt / 2 + kt**2 / 6 - kt**3 / 24), -np.expm1(-kt) / k)
+        lag = np.where(series, t**2 * (1 / 2 - kt / 6 + kt**2 / 24 - kt**3 / 120), (t - tau) / k)
+    return tau, lag
+
+
+def linear_drag_state(t, speed, angle, height=0.0, k=0.0, g=G):
+    # Closed-form state of a body under linear drag k at times t, all
+    # arguments broadcast against each other; returns x, y, v_x, v_y
+    t, speed, angle, height, k = np.broadcast_arrays(*(np.asarray(a, dtype=float)
+                                                       for a in (t, speed, angle, height, k)))
+    angle = np.radians(angle)
+    v_x0, v_y0 = speed * np.cos(angle), speed * np.sin(angle)
+    tau, lag = _drag_time(t, k)
+    decay = np.exp(-k * t)
+    return v_x0 * tau, height + v_y0 * tau - g * lag, v_x0 * decay, v_y0 * decay - g * tau
+
+
+def linear_drag_landing(speed, angle, height=0.0, k=0.0, g=G):
+    # Closed-form range, apex height and flight time under linear drag.
+    # Apex at t = log1p(k v_y0 / g) / k. With A = v_y0 + g/k, y(T) = 0 reads
+    # T = a - c e^(-k T), a = (k h + A) / g, c = A / g, whose landing root is
+    # T = a + W0(-k c e^(-k a)) / k on the principal branch of Lambert W
+    # (the other branch is the launch itself when h = 0). For weak drag the
+    # drag-free time is the start instead; Newton steps on the closed form
+    # then clean up either.
+    speed, angle, height, k = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (speed, angle, height, k)))
+    v_y0 = speed * np.sin(np.radians(angle))
+    free_time = (v_y0 + np.sqrt(v_y0**2 + 2 * g * height)) / g
+    drag = k * free_time >= _SERIES_LIMIT
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        A = v_y0 + g / k
+        a = (k * height + A) / g
+        c = A / g
+        T = np.where(drag, a + lambertw(-k * c * np.exp(-k * a)).real / k, free_time)
+        apex_time = np.where(k > 0, np.log1p(k * np.maximum(v_y0, 0) / g) / k, np.maximum(v_y0, 0) / g)
+    for _ in range(3):
+        _, y, _, v_y = linear_drag_state(T, speed, angle, height, k, g)
+        T = T - y / np.where(v_y == 0, -1.0, v_y)
+    T = np.where((height <= 0) & (v_y0 <= 0), 0.0, T)
+    x, _, _, _ = linear_drag_state(T, speed, angle, height, k, g)
+    _, apex, _, _ = linear_drag_state(apex_time, speed, angle, height, k, g)
+    return x, apex, T
+
+
+def simulate_batch(speed, angle, height=0.0, k=0.0, g=G, method="rk45", dt=1e-3, rtol=1e-8, atol=1e-8,
+                   t_max=1e4, chunk_size=DEFAULT_CHUNK_SIZE, drag="linear", density_height=np.inf):
+    # Range, apex height and flight time of a body thrown with speed (m/s)
+    # at angle (degrees) from height under drag k ("linear" or "quadratic",
+    # with the air density falling off over density_height), for whole
+    # arrays of launch parameters at once (broadcast against each other).
+    # Bodies are integrated chunk_size at a time to bound memory; method
+    # "analytic" evaluates the closed form instead (linear_drag_landing,
+    # linear drag in uniform air only).
+    rhs, _ = _drag_model(drag)
+    if method == "analytic":
+        if drag != "linear" or np.any(np.isfinite(density_height)):
+            raise ValueError("Точное решение есть только для линейного сопротивления в однородной среде.")
+        return linear_drag_landing(speed, angle, height, k, g)
+    speed, angle, height, k, density_height = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (speed, angle, height, k, density_height)))
+    shape = speed.shape
+    state = initial_state(speed, angle, height)
+    k = k.ravel()
+    density_height = density_height.ravel()
+    results = [np.empty(state.shape[1]) for _ in range(3)]
+    for start in range(0, state.shape[1], chunk_size):
+        part = slice(start, start + chunk_size)
+        chunk = integrate_to_ground(rhs, state[:, part], (k[part], g, density_height[part]), method, dt, rtol, atol,
+                                    t_max)
+        for result, values in zip(results, chunk):
+            result[part] = values
+    return tuple(result.reshape(shape) for result in results)
+
+
+def _ground(t, state):
+    return state[1]
+
+
+_ground.terminal = True
+_ground.direction = -1
+
+
+def trajectory(speed, angle, height=0.0, k=0.0, g=G, rtol=1e-8, atol=1e-8, t_max=1e4,
+               points_per_step=DEFAULT_POINTS_PER_STEP, drag="linear", density_height=np.inf, method="RK45"):
+    # Flight of one body under drag k up to its impact with the ground.
+    # solve_ivp stops at the y = 0 event (refined by its root finder on the
+    # dense output); the time span starts near the drag-free flight time and is
+    # doubled, continuing from where the previous span ended, until the body
+    # lands or t_max is reached. Output points are the solver's own steps
+    # with points_per_step more inside each one from the dense output, so
+    # their density follows the motion. method is the solve_ivp method; the
+    # implicit ones ("Radau", "BDF", for strong drag) get the Jacobian.
+    # Returns t, the (4, len(t)) states and a Landing (None if the body is
+    # still in the air at t_max).
+    rhs, jacobian = _drag_model(drag)
+    params = (k, g, density_height)
+    options = {"jac": lambda t, y: jacobian(y, *params)} if method in ("Radau", "BDF", "LSODA") else {}
+    state = initial_state(speed, angle, height)[:, 0]
+    if state[1] <= 0 and state[3] <= 0:
+        return np.zeros(1), state[:, None], Landing(0.0, 0.0, float(np.hypot(state[2], state[3])))
+    # A margin over the drag-free time keeps the impact inside the first span
+    span = max(1.5 * (state[3] + np.sqrt(state[3]**2 + 2 * g * state[1])) / g, 1e-3)
+    start = 0.0
+    times, states = [np.zeros(1)], [state[:, None]]
+    fractions = np.arange(1, points_per_step + 1) / (points_per_step + 1)
+    while True:
+        end = min(start + span, t_max)
+        solution = solve_ivp(lambda t, y: rhs(y, *params), (start, end), state, method=method, rtol=rtol,
+                             atol=atol, events=_ground, dense_output=True, vectorized=True, **options)
+        if solution.status == -1:
+            raise RuntimeError(solution.message)
+        steps = solution.t
+        inner = (steps[:-1, None] + np.diff(steps)[:, None] * fractions).ravel()
+        t = np.unique(np.concatenate([inner, steps[1:]]))
+        times.append(t)
+        states.append(solution.sol(t))
+        if solution.status == 1:
+            impact = solution.y_events[0][0]
+            times[-1][-1] = solution.t_events[0][0]
+            states[-1][:, -1] = impact
+            states[-1][1, -1] = 0.0
+            landing = Landing(float(solution.t_events[0][0]), float(impact[0]),
+                              float(np.hypot(impact[2], impact[3])))
+            break
+        if end >= t_max:
+            landing = None
+            break
+        start, state, span = end, solution.y[:, -1], 2 * span
+    return np.concatenate(times), np.concatenate(states, axis=1), landing
+
+
+def analytic_error_report(speed, angle, height=0.0, k=0.0, g=G, sample_size=1000, rtol=1e-10, atol=1e-10, seed=0):
+    # Compares the closed form with the numerical integration on a random
+    # sample of the launches and reports the largest deviations
+    speed, angle, height, k = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (speed, angle, height, k)))
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(speed.size, size=min(sample_size, speed.size), replace=False)
+    launches = [a.ravel()[sample] for a in (speed, angle, height, k)]
+    exact = linear_drag_landing(*launches, g)
+    numeric = simulate_batch(*launches, g, rtol=rtol, atol=atol)
+    return {
+        "max_range_error": np.abs(exact[0] - numeric[0]).max(),
+        "max_apex_error": np.abs(exact[1] - numeric[1]).max(),
+        "max_time_error": np.abs(exact[2] - numeric[2]).max(),
+    }
+
+
+def _range_slope(angle, speed, height, k, g, step, options):
+    # dR/d(angle) by a central difference, per body
+    distance = simulate_batch(speed, np.stack([angle - step, angle + step]), height, k, g, **options)[0]
+    return (distance[1] - distance[0]) / (2 * step)
+
+
+def optimal_angle(speed, height=0.0, k=0.0, g=G, low=0.0, high=90.0, guess=None, width=DEFAULT_WARM_WIDTH,
+                  xtol=1e-6, step=1e-3, max_iterations=100, **options):
+    # Launch angle (degrees) of maximum range for every body of the
+    # broadcast arrays: the root of dR/d(angle) in [low, high], found by
+    # regula falsi with the Illinois modification, all bodies together.
+    # With guess (e.g. the optimum of a neighbouring grid cell) the search
+    # starts in guess +- width and falls back to [low, high] where that
+    # bracket holds no sign change. If neither does, the better end is
+    # returned. options go to simulate_batch (method, drag, rtol, ...).
+    speed, height, k = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (speed, height, k)))
+    shape = speed.shape
+    speed, height, k = speed.ravel(), height.ravel(), k.ravel()
+    a = np.full(speed.size, float(low))
+    b = np.full(speed.size, float(high))
+    if guess is not None:
+        guess = np.broadcast_to(np.asarray(guess, dtype=float), shape).ravel()
+        a, b = np.maximum(guess - width, low), np.minimum(guess + width, high)
+    fa = _range_slope(a, speed, height, k, g, step, options)
+    fb = _range_slope(b, speed, height, k, g, step, options)
+    cold = ~((fa >= 0) & (fb <= 0))
+    if guess is not None and cold.any():
+        a[cold], b[cold] = low, high
+        fa[cold] = _range_slope(a[cold], speed[cold], height[cold], k[cold], g, step, options)
+        fb[cold] = _range_slope(b[cold], speed[cold], height[cold], k[cold], g, step, options)
+
+    bracketed = (fa >= 0) & (fb <= 0)
+    ends = [simulate_batch(speed, end, height, k, g, **options)[0] for end in (a, b)]
+    angle = np.where(ends[0] >= ends[1], a, b)
+    angle[bracketed] = np.where(fa[bracketed] == 0, a[bracketed], b[bracketed])
+    active = np.flatnonzero(bracketed & (fa != 0) & (fb != 0))
+    side = np.zeros(speed.size, dtype=np.int8)
+    for _ in range(max_iterations):
+        if not len(active):
+            break
+        c = (a[active] * fb[active] - b[active] * fa[active]) / (fb[active] - fa[active])
+        fc = _range_slope(c, speed[active], height[active], k[active], g, step, options)
+        moved = np.abs(c - angle[active])
+        angle[active] = c
+        # The end on the same side as c moves; if the same end moved the
+        # previous time too, the slope kept at the other end is halved
+        left = fc > 0
+        again = left & (side[active] == -1)
+        fb[active[again]] /= 2
+        again = ~left & (side[active] == 1)
+        fa[active[again]] /= 2
+        a[active[left]], fa[active[left]] = c[left], fc[left]
+        b[active[~left]], fb[active[~left]] = c[~left], fc[~left]
+        side[active] = np.where(left, -1, 1)
+        active = active[(moved > xtol) & (fc != 0) & (b[active] - a[active] > xtol)]
+    return angle.reshape(shape)
+
+
+def range_envelope(speed, k, height=0.0, g=G, width=DEFAULT_WARM_WIDTH, **options):
+    # Table of the best launch over the grid speed x k (1-D arrays, speed
+    # sorted): optimal angle with its range, apex height and flight time,
+    # and the height of a vertical throw. Every few speeds are searched
+    # first over the whole range of angles; then, halving the stride, the
+    # speeds in between start from the angles interpolated between their
+    # solved neighbours, each level in one batch.
+    # Returns an Envelope of (len(speed), len(k)) arrays.
+    speed = np.asarray(speed, dtype=float)
+    k = np.asarray(k, dtype=float)
+    grid_speed, grid_k = np.meshgrid(speed, k, indexing="ij")
+    angle = np.empty(grid_speed.shape)
+    stride = 1 << max(0, int(np.log2(max(len(speed) - 1, 1))) - 2)
+    rows = np.union1d(np.arange(0, len(speed), stride), [len(speed) - 1])
+    angle[rows] = optimal_angle(grid_speed[rows], height, grid_k[rows], g, width=width, **options)
+    solved = np.zeros(len(speed), dtype=bool)
+    solved[rows] = True
+    while stride > 1:
+        stride //= 2
+        rows = np.flatnonzero(~solved)[(np.flatnonzero(~solved) % stride) == 0]
+        known = np.flatnonzero(solved)
+        right = known[np.searchsorted(known, rows)]
+        left = known[np.searchsorted(known, rows) - 1]
+        weight = ((speed[rows] - speed[left]) / (speed[right] - speed[left]))[:, None]
+        guess = (1 - weight) * angle[left] + weight * angle[right]
+        angle[rows] = optimal_angle(grid_speed[rows], height, grid_k[rows], g, guess=guess, width=width, **options)
+        solved[rows] = True
+    distance, apex, flight_time = simulate_batch(grid_speed, angle, height, grid_k, g, **options)
+    max_height = simulate_batch(grid_speed, 90.0, height, grid_k, g, **options)[1]
+    return Envelope(grid_speed, grid_k, angle, distance, apex, flight_time, max_height)
+
+
+def write_envelope(path, envelope):
+    # One CSV row per grid cell
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(Envelope._fields)
+        writer.writerows(zip(*(np.ravel(values) for values in envelope)))
@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from SpringSolver import SYMPLECTIC_ORDERS, _composition
+
+DEFAULT_CHUNK_MEMORY = 64 * 2**20
+# Names of the recorded series, as the .npy files written by simulate_chain
+CHAIN_SERIES = ("x", "kinetic", "potential")
+
+
+def chain_stiffness(k, n, fixed_left=True, fixed_right=True):
+    # Stiffness matrix of n masses in a line joined by n + 1 springs: wall,
+    # mass 1, ..., mass n, wall (k scalar or one value per spring). A free
+    # end drops its wall spring. The matrix is tridiagonal, returned as CSR.
+    k = np.broadcast_to(np.asarray(k, dtype=float), (n + 1,)).copy()
+    if np.any(k < 0):
+        raise ValueError("Жесткость пружины не может быть отрицательной.")
+    k[0] *= fixed_left
+    k[-1] *= fixed_right
+    return sp.diags([-k[1:-1], k[:-1] + k[1:], -k[1:-1]], [-1, 0, 1], shape=(n, n), format="csr")
+
+
+def lattice_stiffness(k, rows, cols):
+    # Square lattice of rows x cols masses, each joined by springs of
+    # stiffness k to its four neighbours and along the border to the fixed
+    # frame; displacement across the lattice plane, masses numbered row by
+    # row. The matrix is the Kronecker sum of two chains.
+    return (sp.kron(sp.identity(rows), chain_stiffness(k, cols)) + sp.kron(chain_stiffness(k, rows),
+                                                                           sp.identity(cols))).tocsr()
+
+
+def stable_step(K, m):
+    # Largest step for which Verlet stays stable: 2 / omega_max, with
+    # omega_max^2 bounded by the largest row sum of |K| / m (Gershgorin)
+    row_sum = np.asarray(abs(K).sum(axis=1)).ravel()
+    return 2 / np.sqrt(np.max(row_sum / m))
+
+
+def simulate_chain(K, m, b=0.0, x0=0.0, v0=0.0, t_stop=1.0, dt=1e-3, method="verlet", record_every=1,
+                   masses=None, directory=None, chunk_memory=DEFAULT_CHUNK_MEMORY):
+    # Motion of coupled masses m x'' = -K x - b x' (K sparse, from
+    # chain_stiffness or lattice_stiffness; m, b per mass or scalar) with the
+    # fixed-step integrators of SpringSolver: every substep costs one sparse
+    # product K x, damping is applied exactly around it as in
+    # integrate_oscillators. Every record_every-th step the displacement and
+    # the kinetic and potential energy of the masses numbered in masses (all
+    # by default) are recorded; the potential energy of a spring is split
+    # evenly between its ends, x_i (K x)_i / 2, so the per-mass values add up
+    # to the total. With directory the series go to x.npy, kinetic.npy and
+    # potential.npy there in chunks of about chunk_memory bytes and read-only
+    # memory maps are returned, as in simulate_transient.
+    # Returns t and the (samples, len(masses)) arrays x, kinetic, potential.
+    if method not in SYMPLECTIC_ORDERS:
+        raise ValueError(f"Неизвестный метод интегрирования: {method}")
+    if dt <= 0 or t_stop <= 0:
+        raise ValueError("Шаг и время расчета должны быть положительными.")
+    K = sp.csr_matrix(K)
+    n = K.shape[0]
+    m = np.broadcast_to(np.asarray(m, dtype=float), (n,))
+    if np.any(m <= 0):
+        raise ValueError("Масса должна быть положительной.")
+    weights = _composition(SYMPLECTIC_ORDERS[method])
+    # A substep of weight w is a Verlet step of w dt; the largest one decides
+    limit = stable_step(K, m) / max(abs(w) for w in weights)
+    if dt >= limit:
+        raise ValueError(f"Шаг слишком велик для устойчивости: нужен шаг меньше {limit:.3g} с.")
+    masses = np.arange(n) if masses is None else np.asarray(masses, dtype=np.int64)
+    steps = max(1, int(round(t_stop / dt)))
+    samples = steps // record_every + 1
+
+    inverse_mass = 1 / m
+    b = np.asarray(b, dtype=float)
+    substeps = [(w * dt, w * dt / 2 * inverse_mass, np.exp(-b * inverse_mass * w * dt / 2)) for w in weights]
+    damped = np.any(b > 0)
+    x = np.broadcast_to(np.asarray(x0, dtype=float), (n,)).copy()
+    v = np.broadcast_to(np.asarray(v0, dtype=float), (n,)).copy()
+    # -K, so that a force evaluation is a single sparse product
+    stiffness = (-K).tocsr()
+    force = stiffness @ x
+    scratch = np.empty(n)
+
+    rows = max(1, min(samples, int(chunk_memory) // (8 * len(CHAIN_SERIES) * max(1, len(masses)))))
+    if directory is None:
+        series = {name: np.empty((samples, len(masses))) for name in CHAIN_SERIES}
+    else:
+        os.makedirs(directory, exist_ok=True)
+        series = {name: np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode="w+",
+                                                  shape=(samples, len(masses))) for name in CHAIN_SERIES}
+    chunk = {name: np.empty((rows, len(masses))) for name in CHAIN_SERIES}
+
+    def record(row):
+        chunk["x"][row] = x[masses]
+        chunk["kinetic"][row] = m[masses] * v[masses]**2 / 2
+        chunk["potential"][row] = -x[masses] * force[masses] / 2
+
+    def flush(written, filled):
+        for name in CHAIN_SERIES:
+            series[name][written:written + filled] = chunk[name][:filled]
+        return written + filled, 0
+
+    record(0)
+    filled = 1
+    written = 0
+    for step in range(1, steps + 1):
+        for h, kick, decay in substeps:
+            if damped:
+                v *= decay
+            v += np.multiply(kick, force, out=scratch)
+            x += np.multiply(h, v, out=scratch)
+            force = stiffness @ x
+            v += np.multiply(kick, force, out=scratch)
+            if damped:
+                v *= decay
+        if step % record_every:
+            continue
+        # A full chunk goes out before the next sample is written into it
+        if filled == rows:
+            written, filled = flush(written, filled)
+        record(filled)
+        filled += 1
+    written, filled = flush(written, filled)
+
+    t = np.arange(samples) * record_every * dt
+    if directory is None:
+        return (t,) + tuple(series[name] for name in CHAIN_SERIES)
+    for values in series.values():
+        values.flush()
+    series.clear()
+    return (t,) + tuple(np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                        for name in CHAIN_SERIES)
@@ -0,0 +1,240 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+DEFAULT_CHUNK_SIZE = 2**16
+# Columns of spring_sweep, in file order
+SWEEP_COLUMNS = ("m", "k", "b", "decay_time", "q_factor", "energy")
+# Order of accuracy of each fixed-step integrator of integrate_oscillators
+SYMPLECTIC_ORDERS = {"verlet": 2, "yoshida4": 4, "yoshida6": 6}
+# Below this value of |omega^2| t^2 the damped cosine and sine are taken
+# from their series, which also covers critical damping exactly
+_SERIES_LIMIT = 1e-6
+
+
+def _damped_basis(t, gamma, omega2):
+    # C = e^(-gamma t) cos(omega t), S = e^(-gamma t) sin(omega t) / omega for
+    # omega^2 = omega0^2 - gamma^2 of either sign (cosh and sinh written as
+    # two decaying exponentials for overdamping, so nothing overflows)
+    decay = np.exp(-gamma * t)
+    phase2 = omega2 * t**2
+    series = np.abs(phase2) < _SERIES_LIMIT
+    with np.errstate(invalid="ignore", divide="ignore"):
+        omega = np.sqrt(np.abs(omega2))
+        under = decay * np.cos(omega * t), decay * np.sin(omega * t) / omega
+        slow, fast = np.exp((omega - gamma) * t), np.exp(-(omega + gamma) * t)
+        over = (slow + fast) / 2, (slow - fast) / (2 * omega)
+    C = np.where(series, decay * (1 - phase2 / 2 + phase2**2 / 24),
+                 np.where(omega2 > 0, under[0], over[0]))
+    S = np.where(series, decay * t * (1 - phase2 / 6 + phase2**2 / 120),
+                 np.where(omega2 > 0, under[1], over[1]))
+    return C, S
+
+
+def damped_oscillation(t, m, k, b, x0=1.0, v0=0.0):
+    # Closed-form solution of m x'' + b x' + k x = 0 with x(0) = x0,
+    # x'(0) = v0: under-, over- and critically damped alike. All arguments
+    # are broadcast against each other, so a whole sweep of parameters and
+    # times is one call. Returns x and v.
+    t, m, k, b, x0, v0 = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (t, m, k, b, x0, v0)))
+    gamma = b / (2 * m)
+    omega0_2 = k / m
+    C, S = _damped_basis(t, gamma, omega0_2 - gamma**2)
+    x = x0 * C + (v0 + gamma * x0) * S
+    v = v0 * C - (omega0_2 * x0 + gamma * v0) * S
+    return x, v
+
+
+def spring_energies(t, m, k, b, x0=1.0, v0=0.0):
+    # Kinetic, potential and total mechanical energy at times t
+    x, v = damped_oscillation(t, m, k, b, x0, v0)
+    kinetic_energy = m * v**2 / 2
+    potential_energy = k * x**2 / 2
+    return kinetic_energy, potential_energy, kinetic_energy + potential_energy
+
+
+def numeric_oscillation(t, m, k, b, x0=1.0, v0=0.0, rtol=1e-10, atol=1e-12):
+    # The same motion from solve_ivp, for one set of parameters and sorted
+    # times t starting at 0
+    t = np.asarray(t, dtype=float)
+
+    def equation(_, y):
+        x, v = y
+        return [v, -(b / m) * v - (k / m) * x]
+
+    solution = solve_ivp(equation, (t[0], t[-1]), [x0, v0], t_eval=t, rtol=rtol, atol=atol)
+    return solution.y[0], solution.y[1]
+
+
+def spring_error_report(m, k, b, t_stop=20.0, points=500, x0=1.0, v0=0.0, rtol=1e-10, atol=1e-12):
+    # Compares the closed form with solve_ivp for every (m, k, b) triple of
+    # the arrays and reports the largest deviations
+    t = np.linspace(0, t_stop, points)
+    x_error = v_error = energy_error = 0.0
+    for mi, ki, bi in zip(*(np.ravel(a) for a in np.broadcast_arrays(m, k, b))):
+        x, v = damped_oscillation(t, mi, ki, bi, x0, v0)
+        x_n, v_n = numeric_oscillation(t, mi, ki, bi, x0, v0, rtol, atol)
+        x_error = max(x_error, np.abs(x - x_n).max())
+        v_error = max(v_error, np.abs(v - v_n).max())
+        energy_error = max(energy_error, np.abs(mi * (v**2 - v_n**2) / 2 + ki * (x**2 - x_n**2) / 2).max())
+    return {
+        "max_x_error": x_error,
+        "max_v_error": v_error,
+        "max_energy_error": energy_error,
+    }
+
+
+def _composition(order):
+    # Weights of the Verlet substeps of Yoshida's triple-jump composition:
+    # a symmetric method of order p becomes one of order p + 2 as steps
+    # w1 h, w0 h, w1 h with w1 = 1 / (2 - 2^(1/(p+1))), w0 = 1 - 2 w1
+    weights = [1.0]
+    for p in range(2, order, 2):
+        w1 = 1 / (2 - 2**(1 / (p + 1)))
+        w0 = 1 - 2 * w1
+        weights = [w * c for c in (w1, w0, w1) for w in weights]
+    return weights
+
+
+def _step_matrix(m, k, b, dt, method):
+    # One step of the integrator is linear in (x, v) for this equation:
+    # returns its (2, 2, *shape) matrix, built by stepping the unit states
+    x = np.stack([np.ones_like(m), np.zeros_like(m)])
+    v = np.stack([np.zeros_like(m), np.ones_like(m)])
+    omega2 = k / m
+    for w in _composition(SYMPLECTIC_ORDERS[method]):
+        h = w * dt
+        decay = np.exp(-b / m * h / 2)
+        v = v * decay - h / 2 * omega2 * x
+        x = x + h * v
+        v = (v - h / 2 * omega2 * x) * decay
+    # Columns are the images of (1, 0) and (0, 1)
+    return np.stack([x, v])
+
+
+def _matrix_product(A, B):
+    # Products of (2, 2, ...) stacks of matrices, element by element
+    return np.einsum("ij...,jk...->ik...", A, B)
+
+
+def integrate_oscillators(m, k, b, t_stop, dt, method="verlet", x0=1.0, v0=0.0, record_every=1):
+    # Fixed-step integration of m x'' + b x' + k x = 0 for all oscillators of
+    # the broadcast arrays at once. "verlet" is velocity Verlet; "yoshida4"
+    # and "yoshida6" are Yoshida compositions of it. Damping is split off
+    # and applied exactly (v times exp(-b h / 2m) before and after each
+    # Verlet substep), which keeps the scheme symmetric; with b = 0 the
+    # methods are symplectic and the energy error stays bounded however
+    # long the run. Every record_every-th step is kept.
+    # The equation is linear, so a step is a 2 x 2 matrix per oscillator and
+    # record_every steps are its power (by repeated squaring): the cost
+    # depends on the number of samples, not of steps.
+    # Returns t (samples,), x and v (samples, *shape).
+    if method not in SYMPLECTIC_ORDERS:
+        raise ValueError(f"Неизвестный метод интегрирования: {method}")
+    if dt <= 0 or t_stop <= 0:
+        raise ValueError("Шаг и время расчета должны быть положительными.")
+    m, k, b, x0, v0 = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (m, k, b, x0, v0)))
+    steps = max(1, int(round(t_stop / dt)))
+    samples = steps // record_every + 1
+
+    step = _step_matrix(m, k, b, dt, method)
+    power = np.zeros_like(step)
+    power[0, 0] = power[1, 1] = 1
+    n = record_every
+    while n:
+        if n & 1:
+            power = _matrix_product(step, power)
+        step = _matrix_product(step, step)
+        n >>= 1
+
+    t = np.arange(samples) * record_every * dt
+    xs = np.empty((samples,) + m.shape)
+    vs = np.empty((samples,) + m.shape)
+    xs[0], vs[0] = x0, v0
+    for i in range(1, samples):
+        xs[i] = power[0, 0] * xs[i - 1] + power[0, 1] * vs[i - 1]
+        vs[i] = power[1, 0] * xs[i - 1] + power[1, 1] * vs[i - 1]
+    return t, xs, vs
+
+
+def decay_statistics(m, k, b):
+    # Energy decay time (the cycle-averaged energy falls by e over it) and
+    # quality factor. The displacement decays as exp(-rate t) with
+    # rate = gamma - Re sqrt(gamma^2 - omega0^2): gamma when underdamped,
+    # the slow root when overdamped; the energy twice as fast.
+    m, k, b = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (m, k, b)))
+    gamma = b / (2 * m)
+    omega0_2 = k / m
+    # gamma - sqrt(gamma^2 - omega0^2) without cancellation for strong damping
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(gamma**2 > omega0_2, omega0_2 / (gamma + np.sqrt(np.maximum(gamma**2 - omega0_2, 0))),
+                        gamma)
+        return 1 / (2 * rate), np.sqrt(m * k) / b
+
+
+def _sweep_chunk(m, k, b, times, x0, v0):
+    decay_time, q_factor = decay_statistics(m, k, b)
+    energy = spring_energies(times[None, :], m[:, None], k[:, None], b[:, None], x0, v0)[2]
+    return m, k, b, decay_time, q_factor, energy
+
+
+def spring_sweep(m, k, b, times=(), x0=1.0, v0=0.0, directory=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    # Energy decay time, Q factor and total energy at the given times for
+    # every (m, k, b) of the broadcast arrays, from the closed form.
+    # Parameters are taken chunk_size triples at a time, so a sweep over a
+    # large grid is never expanded in memory; chunks run in workers
+    # processes (None: one per CPU). Results are flat columns (energy is
+    # (count, len(times))) named as in SWEEP_COLUMNS: a dict of arrays, or
+    # with directory <column>.npy files there, returned as read-only memory
+    # maps.
+    m, k, b = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (m, k, b)))
+    if np.any(m <= 0) or np.any(k <= 0) or np.any(b < 0):
+        raise ValueError("Масса и жесткость должны быть положительными, сопротивление неотрицательным.")
+    times = np.asarray(times, dtype=float).ravel()
+    count = m.size
+    shapes = {name: (count,) for name in SWEEP_COLUMNS}
+    shapes["energy"] = (count, len(times))
+    if directory is None:
+        columns = {name: np.empty(shape) for name, shape in shapes.items()}
+    else:
+        os.makedirs(directory, exist_ok=True)
+        columns = {name: np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode="w+", shape=shape)
+                   for name, shape in shapes.items()}
+
+    starts = range(0, count, chunk_size)
+
+    def chunks():
+        for start in starts:
+            index = np.unravel_index(np.arange(start, min(start + chunk_size, count)), m.shape)
+            yield m[index], k[index], b[index]
+
+    def store(start, part):
+        for name, values in zip(SWEEP_COLUMNS, part):
+            columns[name][start:start + len(values)] = values
+
+    if workers != 1 and len(starts) > 1:
+        workers = workers or os.cpu_count()
+        # At most two chunks per worker in flight, so memory stays bounded
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for start, chunk in zip(starts, chunks()):
+                pending.append((start, pool.submit(_sweep_chunk, *chunk, times, x0, v0)))
+                if len(pending) > 2 * workers:
+                    start, future = pending.popleft()
+                    store(start, future.result())
+            for start, future in pending:
+                store(start, future.result())
+    else:
+        for start, chunk in zip(starts, chunks()):
+            store(start, _sweep_chunk(*chunk, times, x0, v0))
+
+    if directory is None:
+        return columns
+    for values in columns.values():
+        values.flush()
+    del values
+    columns.clear()
+    return {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in SWEEP_COLUMNS}